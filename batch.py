@@ -0,0 +1,132 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pipeline import Pipeline
+
+# Config values naming a file that would be shared between jobs; each job keeps its own copy
+JOB_LOCAL_FILES = ["Transaction_Store", "Category_Cache", "Graph_Cache", "Stage_Cache"]
+
+def load_batch(batch_file):
+    """
+    Load a batch file and check its jobs.
+
+    A batch file looks like
+    {"Output_Dir": "reports", "Workers": "2", "Jobs": [{"Name": "current", "Input_Folder": "input/current",
+    "Config": {"AccountName": "Current Account"}}, ...]}. Every job's Config is laid over the Config
+    of settings.json.
+
+    Args:
+        batch_file (str): Path of the batch JSON file.
+
+    Returns:
+        dict: The parsed batch.
+
+    Raises:
+        ValueError: If a job has no name or two jobs share one.
+    """
+    with open(batch_file, "r") as f:
+        batch = json.load(f)
+    names = [job.get("Name") for job in batch.get("Jobs", [])]
+    if not names or not all(names):
+        raise ValueError(f"Every job in {batch_file} needs a Name.")
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Job names must be unique in {batch_file}: {', '.join(duplicates)}")
+    return batch
+
+def job_settings(settings, job, output_dir):
+    """
+    Build one job's settings from settings.json and the job's own Config.
+
+    Args:
+        settings (dict): The parsed settings.json.
+        job (dict): One entry of the batch's Jobs.
+        output_dir (str): The job's output directory.
+
+    Returns:
+        dict: Settings for the job's Pipeline.
+    """
+    config = {**settings.get("Config", {}), **job.get("Config", {})}
+    # Stores and caches are per account, so they go into the job's own directory
+    for key in JOB_LOCAL_FILES:
+        if config.get(key):
+            config[key] = os.path.join(output_dir, os.path.basename(config[key]))
+    return {**settings, "Config": config}
+
+def run_job(settings, job, output_root, export=False, force=False):
+    """
+    Run one report from ingest to PDF in its own output directory.
+
+    Errors are caught and reported in the result, so one bad account doesn't stop the batch.
+
+    Args:
+        settings (dict): The parsed settings.json.
+        job (dict): One entry of the batch's Jobs.
+        output_root (str): Directory holding one subdirectory per job.
+        export (bool): Also write the intermediate files of the job.
+        force (bool): Rebuild the report even if nothing changed.
+
+    Returns:
+        dict: Name, Status ("ok" or "failed"), Seconds, and the Report path or the Error.
+    """
+    output_dir = os.path.join(output_root, job["Name"])
+    start = time.perf_counter()
+    result = {"Name": job["Name"], "Output_Dir": output_dir}
+    try:
+        pipeline = Pipeline(
+            job_settings(settings, job, output_dir),
+            input_folder=job.get("Input_Folder", "input"),
+            mapping_file=job.get("Mapping_File", "banks.json"),
+            filter_file=job.get("Filter_File", "filter.json"),
+            output_dir=output_dir,
+            export=export
+        )
+        result.update(Status="ok", Report=pipeline.run(force=force))
+    except Exception as e:
+        result.update(Status="failed", Error=f"{type(e).__name__}: {e}")
+    result["Seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def run_batch(settings, batch, export=False, workers=None, force=False):
+    """
+    Run every job of a batch, on a process pool when more than one worker is set.
+
+    Args:
+        settings (dict): The parsed settings.json.
+        batch (dict): The parsed batch file (see load_batch).
+        export (bool): Also write the intermediate files of every job.
+        workers (int, optional): Jobs run at once; defaults to the batch's Workers.
+        force (bool): Rebuild every report even if nothing changed.
+
+    Returns:
+        list of dict: One result per job, in the order of the batch (see run_job).
+    """
+    jobs = batch["Jobs"]
+    output_root = batch.get("Output_Dir", "reports")
+    workers = workers or int(batch.get("Workers", "1"))
+    start = time.perf_counter()
+    if workers <= 1 or len(jobs) <= 1:
+        results = [run_job(settings, job, output_root, export, force) for job in jobs]
+    else:
+        print(f"Running {len(jobs)} jobs on {min(workers, len(jobs))} workers.")
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            futures = [executor.submit(run_job, settings, job, output_root, export, force) for job in jobs]
+            results = [future.result() for future in futures]
+
+    # Keep the summary next to the reports
+    summary = {"Seconds": round(time.perf_counter() - start, 3), "Workers": workers, "Jobs": results}
+    os.makedirs(output_root, exist_ok=True)
+    with open(os.path.join(output_root, "batch_summary.json"), "w") as f:
+        json.dump(summary, f, indent=4)
+    print_summary(summary)
+    return results
+
+def print_summary(summary):
+    # One line per job, failures with their error
+    print(f"\n{'Job':<24} {'Status':<8} {'Seconds':>8}  Report / Error")
+    for result in summary["Jobs"]:
+        detail = result.get("Report") if result["Status"] == "ok" else result.get("Error")
+        print(f"{result['Name']:<24} {result['Status']:<8} {result['Seconds']:>8.2f}  {detail}")
+    failed = sum(result["Status"] != "ok" for result in summary["Jobs"])
+    print(f"{len(summary['Jobs']) - failed} ok, {failed} failed in {summary['Seconds']:.2f}s.")
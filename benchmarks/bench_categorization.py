@@ -0,0 +1,91 @@
+# Benchmark for the compiled keyword matcher against the original per-keyword loop
+# Run from the repository root: python benchmarks/bench_categorization.py
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor.matcher import KeywordMatcher
+
+PREFIXES = ["VDP-", "VDC-", "VDA-", "D/D ", "*MOBI ", ""]
+
+
+def random_word(rng, low=4, high=10):
+    return "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(low, high)))
+
+
+def make_filters(rng, keyword_count, per_subcategory=10):
+    # Spread the keywords over subcategories the way filter.json does
+    filters = {"Expenses": {}}
+    for index in range(0, keyword_count, per_subcategory):
+        count = min(per_subcategory, keyword_count - index)
+        filters["Expenses"][f"Sub{index // per_subcategory}"] = [random_word(rng) for _ in range(count)]
+    return filters
+
+
+def make_descriptions(rng, filters, row_count, vocabulary=500):
+    # Half of the vocabulary contains a known keyword, the rest is noise
+    keywords = [keyword for subcategories in filters.values() for keywords in subcategories.values() for keyword in keywords]
+    vocab = []
+    for index in range(vocabulary):
+        word = rng.choice(keywords) if index % 2 == 0 else random_word(rng)
+        vocab.append(rng.choice(PREFIXES) + word + " " + str(rng.randint(1, 9999)))
+    return [rng.choice(vocab) for _ in range(row_count)]
+
+
+def legacy_categorize(filters, description):
+    # The loop extract_data used before the matcher
+    hits = []
+    for main_category, subcategories in filters.items():
+        for subcategory, keywords in subcategories.items():
+            if isinstance(keywords, list):
+                if any(keyword.upper() in description.upper() for keyword in keywords):
+                    hits.append((main_category, subcategory))
+            elif isinstance(keywords, str):
+                if keywords.upper() in description.upper():
+                    hits.append((main_category, subcategory))
+    return hits
+
+
+def run(rows, keywords, legacy_budget):
+    rng = random.Random(rows * 31 + keywords)
+    filters = make_filters(rng, keywords)
+    descriptions = make_descriptions(rng, filters, rows)
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(filters)
+    compiled = [matcher.categorize(description) for description in descriptions]
+    matcher_time = time.perf_counter() - start
+
+    # The legacy loop is O(rows x keywords); skip it where it would take hours
+    legacy_time = None
+    if rows * keywords <= legacy_budget:
+        start = time.perf_counter()
+        legacy = [legacy_categorize(filters, description) for description in descriptions]
+        legacy_time = time.perf_counter() - start
+        if legacy != compiled:
+            raise AssertionError(f"Matcher disagrees with the legacy loop at {rows} rows x {keywords} keywords")
+
+    return matcher_time, legacy_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extract_data categorization.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--keywords", type=int, nargs="+", default=[10, 1_000, 10_000])
+    parser.add_argument("--legacy-budget", type=int, default=10**9,
+                        help="Largest rows x keywords product to time the legacy loop on")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'keywords':>9} {'matcher (s)':>12} {'legacy (s)':>12} {'speedup':>8}")
+    for rows in args.rows:
+        for keywords in args.keywords:
+            matcher_time, legacy_time = run(rows, keywords, args.legacy_budget)
+            if legacy_time is None:
+                print(f"{rows:>10} {keywords:>9} {matcher_time:>12.3f} {'skipped':>12} {'-':>8}")
+            else:
+                print(f"{rows:>10} {keywords:>9} {matcher_time:>12.3f} {legacy_time:>12.3f} {legacy_time / matcher_time:>7.1f}x")
@@ -0,0 +1,128 @@
+# Benchmark for the breakdown pages of the PDF against the original per-row cell() loop
+# Run from the repository root: python benchmarks/bench_pdf.py
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fpdf import FPDF
+from converter.money import format_money
+from crafter.pdfer import add_other_pages, format_dates
+
+SUBCATEGORIES = {
+    "Income": ["Salary", "Refunds"],
+    "Expenses": ["Groceries", "Rent", "Takeaway", "Fuel"],
+    "Transfers": ["Savings"],
+    "Withdrawals": ["ATM"],
+}
+
+
+def make_data(rng, row_count, vocabulary=2_000):
+    # Categorized data shaped like extract_data's output, a fifth of it uncategorized
+    data = {category: {subcategory: [] for subcategory in subcategories} for category, subcategories in SUBCATEGORIES.items()}
+    data["Uncategorized"] = []
+    buckets = [data[category][subcategory] for category, subcategories in SUBCATEGORIES.items() for subcategory in subcategories]
+    descriptions = [f"VDP-MERCHANT {index}" for index in range(vocabulary)]
+    for _ in range(row_count):
+        bucket = data["Uncategorized"] if rng.random() < 0.2 else rng.choice(buckets)
+        bucket.append({
+            "Date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "Description": rng.choice(descriptions),
+            "Amount": round(rng.uniform(-2_000, 3_000), 2),
+        })
+    return data
+
+
+def legacy_add_other_pages(pdf, w, data):
+    # The breakdown loop create_pdf used before the precomputed layout
+    categories = ["Income", "Expenses", "Transfers", "Withdrawals"]
+    uncategorized = data.get("Uncategorized", [])
+    pdf.add_page()
+    pdf.set_xy(((w / 2) - (70 / 2)), 13)
+    pdf.set_font('helvetica', 'B', 16)
+    pdf.cell(70, 15, 'Budget Breakdown', border=0, align='C')
+    y_position = 30
+    rows = [transaction for category in categories if category in data
+            for transactions in data[category].values() for transaction in transactions]
+    date_lookup = format_dates(transaction["Date"] for transaction in rows + uncategorized)
+
+    def add_row(transaction):
+        nonlocal y_position
+        if y_position > 260:
+            pdf.add_page()
+            y_position = 20
+        pdf.set_xy(20, y_position)
+        pdf.set_font('helvetica', '', 10)
+        pdf.cell(30, 10, date_lookup[transaction["Date"]], border=0, align='C')
+        pdf.cell(100, 10, transaction["Description"], border=0, align='L')
+        pdf.cell(40, 10, format_money(transaction['Amount']), border=0, align='R')
+        y_position += 10
+
+    def add_header(text, size, border, align):
+        nonlocal y_position
+        if y_position > 260:
+            pdf.add_page()
+            y_position = 20
+        pdf.set_xy(20, y_position)
+        pdf.set_font('helvetica', 'B', size)
+        pdf.cell(170, 10, text, border=border, align=align)
+        y_position += 10
+
+    for category in categories:
+        if category in data:
+            add_header(category, 14, 1, 'C')
+            for subcategory, transactions in data[category].items():
+                if transactions:
+                    add_header(subcategory, 11, 0, 'L')
+                    for transaction in transactions:
+                        add_row(transaction)
+    if uncategorized:
+        add_header('Uncategorized Transactions', 14, 1, 'C')
+        for transaction in uncategorized:
+            add_row(transaction)
+
+
+def render(renderer, data):
+    # Time one breakdown section and return it with its page contents
+    pdf = FPDF('P', 'mm', 'A4')
+    pdf.set_compression(False)
+    start = time.perf_counter()
+    renderer(pdf, 210, data)
+    layout_time = time.perf_counter() - start
+    # Raw page contents, taken before output() turns them into stream objects
+    contents = [bytes(pdf.pages[page].contents) for page in range(1, pdf.page + 1)]
+    start = time.perf_counter()
+    size = len(pdf.output())
+    output_time = time.perf_counter() - start
+    return layout_time, output_time, size, contents
+
+
+def run(rows, legacy_budget):
+    data = make_data(random.Random(rows), rows)
+    layout_time, output_time, size, contents = render(add_other_pages, data)
+
+    # The legacy loop takes minutes at 100k rows; skip it past the budget
+    legacy_time = None
+    if rows <= legacy_budget:
+        legacy_time, _, _, legacy_contents = render(legacy_add_other_pages, data)
+        if legacy_contents != contents:
+            raise AssertionError(f"Breakdown pages differ from the legacy loop at {rows} rows")
+
+    return layout_time, output_time, size, len(contents), legacy_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the PDF breakdown pages.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--legacy-budget", type=int, default=100_000,
+                        help="Largest row count to time the legacy loop on")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'pages':>6} {'size (KB)':>10} {'layout (s)':>11} {'output (s)':>11} {'legacy (s)':>11} {'speedup':>8}")
+    for rows in args.rows:
+        layout_time, output_time, size, pages, legacy_time = run(rows, args.legacy_budget)
+        legacy = f"{legacy_time:>11.3f} {legacy_time / layout_time:>7.1f}x" if legacy_time is not None else f"{'skipped':>11} {'-':>8}"
+        print(f"{rows:>8} {pages:>6} {size / 1024:>10.0f} {layout_time:>11.3f} {output_time:>11.3f} {legacy}")
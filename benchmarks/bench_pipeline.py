@@ -0,0 +1,98 @@
+# Benchmark suite for the pipeline stages on synthetic AIB statements
+# Run from the repository root: python benchmarks/bench_pipeline.py --rows 1000 100000
+# Save a baseline with --save base.json, then check a change against it with --compare base.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_statements import generate_statements
+from converter.transaction_processor import TransactionProcessor
+from processor.extractor import extract_data
+from grapher import create_graph
+from crafter.pdfer import create_pdf
+
+STAGES = ["process_transactions", "extract_data", "create_graph", "create_pdf"]
+
+SETTINGS = {"Config": {"AccountName": "Benchmark", "Bank": "AIB", "Currency": "EUR", "Graph_Interval": "30"}}
+
+
+def best_of(function, repeat):
+    # Fastest of `repeat` runs and the last result; the stages' progress prints are silenced
+    times, result = [], None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def run(rows, directory, stages, repeat, args):
+    input_folder = os.path.join(directory, f"input_{rows}")
+    generate_statements(input_folder, rows, args.merchants, args.duplicate_rate, args.days, args.files)
+    mapping_file = os.path.join(ROOT, "banks.json")
+    filter_file = os.path.join(ROOT, "filter.json")
+
+    # Every stage needs the one before it, so the earlier ones always run
+    timings = {}
+    processor = TransactionProcessor(input_folder, None, mapping_file, bank="AIB")
+    timings["process_transactions"], transactions = best_of(processor.process_transactions, repeat)
+    if "extract_data" in stages or "create_pdf" in stages:
+        timings["extract_data"], data = best_of(lambda: extract_data(transactions, filter_file), repeat)
+    if "create_graph" in stages or "create_pdf" in stages:
+        timings["create_graph"], graph = best_of(lambda: create_graph(transactions, "EUR", 30), repeat)
+    if "create_pdf" in stages:
+        output_file = os.path.join(directory, "Budget.pdf")
+        timings["create_pdf"], _ = best_of(lambda: create_pdf(output_file, transactions, data, SETTINGS, graph), repeat)
+    return {stage: round(seconds, 4) for stage, seconds in timings.items() if stage in stages}
+
+
+def compare(results, baseline, tolerance):
+    # Stages slower than the baseline by more than the tolerance
+    regressions = []
+    for rows, timings in results.items():
+        for stage, seconds in timings.items():
+            before = baseline.get(rows, {}).get(stage)
+            if before and seconds > before * (1 + tolerance):
+                regressions.append(f"{stage} at {rows} rows: {before:.3f}s -> {seconds:.3f}s (+{seconds / before - 1:.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic statements.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest counts")
+    parser.add_argument("--merchants", type=int, default=500)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--save", metavar="FILE", help="Write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Fail if a stage is slower than in this saved run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against --compare")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'rows':>9} " + " ".join(f"{stage:>21}" for stage in args.stages))
+    with tempfile.TemporaryDirectory(prefix="miabudget-bench-") as directory:
+        for rows in args.rows:
+            results[str(rows)] = run(rows, directory, args.stages, args.repeat, args)
+            print(f"{rows:>9} " + " ".join(f"{results[str(rows)][stage]:>20.3f}s" for stage in args.stages))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
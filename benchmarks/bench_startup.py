@@ -0,0 +1,69 @@
+# Benchmark for import times and cold starts of the CLI
+# Run from the repository root: python benchmarks/bench_startup.py
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules of the project, from the entry point down to the heavy stages
+MODULES = ["main", "pipeline", "batch", "converter.transaction_processor", "processor.extractor",
+           "grapher", "charts", "crafter.pdfer"]
+
+# main.py invocations timed in a scratch copy of the repository
+COMMANDS = [
+    ("help", ["--help"]),
+    ("full run", ["--force"]),
+    ("nothing changed", []),
+    ("ingest only", ["ingest"]),
+]
+
+
+def import_time(module, cwd):
+    # Cumulative import time of a module in a fresh interpreter, from -X importtime, in seconds
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, capture_output=True, text=True, check=True)
+    pattern = re.compile(r"import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*" + re.escape(module) + r"$")
+    for line in result.stderr.splitlines():
+        match = pattern.match(line.rstrip())
+        if match:
+            return int(match.group(1)) / 1e6
+    return 0.0
+
+
+def wall_time(arguments, cwd):
+    # Seconds for one `python main.py ...` from process start to exit
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", *arguments], cwd=cwd, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def median(function, repeat):
+    return statistics.median(function() for _ in range(repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark import times and CLI cold starts.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the median is shown")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="miabudget-bench-") as directory:
+        # Work on a copy, so the benchmark never touches the real reports or store
+        work = os.path.join(directory, "repo")
+        shutil.copytree(ROOT, work, ignore=shutil.ignore_patterns(".git", "reports", "*.pdf", "*.db", "graph_cache", "stage_cache"))
+
+        print(f"{'module':<34} {'import (s)':>10}")
+        for module in MODULES:
+            print(f"{module:<34} {median(lambda: import_time(module, work), args.repeat):>10.3f}")
+
+        print(f"\n{'main.py':<34} {'wall (s)':>10}")
+        for name, arguments in COMMANDS:
+            if name == "nothing changed":
+                wall_time([], work)  # Make sure a report for the current inputs exists
+            print(f"{name:<34} {median(lambda: wall_time(arguments, work), args.repeat):>10.3f}")
@@ -0,0 +1,119 @@
+# Synthetic AIB statement generator for benchmarks
+# Run from the repository root: python benchmarks/generate_statements.py input_bench --rows 100000
+import argparse
+import csv
+import os
+import numpy as np
+import pandas as pd
+
+# Header row of an AIB export, leading spaces included (see "AIB" in banks.json)
+AIB_HEADER = ["Posted Account", " Posted Transactions Date", " Description1", " Description2", " Description3",
+              " Debit Amount", " Credit Amount", "Balance", "Posted Currency", "Transaction Type",
+              "Local Currency Amount", "Local Currency"]
+
+# Description prefixes AIB puts in front of card, online and direct debit payments
+PREFIXES = ["VDP-", "VDC-", "VDA-", "D/D ", "*MOBI ", ""]
+
+# Merchants from filter.json, so part of the vocabulary gets categorized
+KNOWN_MERCHANTS = ["TESCO", "LIDL", "ASDA", "STARBUCKS", "WETHERSPOON", "SUBWAY", "SPAR", "APPLEGREEN",
+                   "AMAZON", "Revolut", "SOLIDWORKS", "Trading 212", "ATM", "FOXY BEAN", "PARKING"]
+
+def merchant_vocabulary(rng, size):
+    # Distinct descriptions: half known merchants, half random names, all with a bank prefix
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    names = []
+    for index in range(size):
+        if index % 2 == 0:
+            name = KNOWN_MERCHANTS[(index // 2) % len(KNOWN_MERCHANTS)]
+        else:
+            name = "".join(rng.choice(letters, rng.integers(4, 11)))
+        names.append(f"{PREFIXES[index % len(PREFIXES)]}{name} {index}"[:18])  # AIB cuts descriptions at 18
+    return np.array(names, dtype=object)
+
+def format_amounts(cents):
+    # "1,234.56" strings like the bank's export; empty where there is no amount. Each distinct amount is formatted once
+    uniques, codes = np.unique(cents, return_inverse=True)
+    text = np.array([f"{value / 100:,.2f}" if value > 0 else "" for value in uniques.tolist()], dtype=object)
+    return pd.Series(text[codes])
+
+def generate_statements(output_folder, rows, merchants=500, duplicate_rate=0.02, days=365, files=1,
+                        start="2024-01-01", account="932256 - 38370040", seed=0):
+    """
+    Write synthetic AIB-format statement CSVs.
+
+    Every transaction is unique except for the duplicated ones: each file after the first
+    starts with the last rows of the file before it, like overlapping exports of the same
+    account do.
+
+    Args:
+        output_folder (str): Folder the CSV files are written to.
+        rows (int): Total rows over all files, duplicates included.
+        merchants (int): Distinct descriptions.
+        duplicate_rate (float): Share of the rows that repeat the previous file; a single file has none.
+        days (int): Days between the first and the last transaction.
+        files (int): Number of statement files the rows are split into, in date order.
+        start (str): Date of the first transaction.
+        account (str): The Posted Account of every row.
+        seed (int): Random seed; the same arguments give the same files.
+
+    Returns:
+        list of str: Paths of the written files.
+    """
+    rng = np.random.default_rng(seed)
+    unique_rows = rows if files == 1 else max(1, int(round(rows * (1 - duplicate_rate))))
+
+    # Sorted dates over the span, ~5% salary and refund credits, the rest card spending
+    offsets = np.sort(rng.integers(0, days + 1, unique_rows))
+    days_text = pd.date_range(start, periods=days + 1, freq="D").strftime("%d/%m/%Y").to_numpy(dtype=object)
+    dates = days_text[offsets]
+    credit = rng.random(unique_rows) < 0.05
+    amounts = np.where(credit, rng.integers(50_000, 350_000, unique_rows), rng.integers(50, 15_000, unique_rows))
+    descriptions = merchant_vocabulary(rng, merchants)[rng.integers(0, merchants, unique_rows)]
+    descriptions = np.where(credit, "NAL HEALTH IR24100", descriptions)
+    balances = 500_000 + np.cumsum(np.where(credit, amounts, -amounts))
+
+    debit = np.where(credit, 0, amounts)
+    income = np.where(credit, amounts, 0)
+    frame = pd.DataFrame({
+        AIB_HEADER[0]: account,
+        AIB_HEADER[1]: dates,
+        AIB_HEADER[2]: descriptions,
+        AIB_HEADER[3]: "",
+        AIB_HEADER[4]: "",
+        AIB_HEADER[5]: format_amounts(debit).to_numpy(),
+        AIB_HEADER[6]: format_amounts(income).to_numpy(),
+        AIB_HEADER[7]: (balances / 100).round(2),
+        AIB_HEADER[8]: "EUR",
+        AIB_HEADER[9]: np.where(income > 0, "Credit", "Debit"),
+        AIB_HEADER[10]: " " + format_amounts(debit + income).to_numpy(),
+        AIB_HEADER[11]: "EUR",
+    })
+
+    # Files split the rows in date order; the duplicates are spread over the overlaps
+    parts = np.array_split(np.arange(unique_rows), files)
+    overlaps = [0] + [len(overlap) for overlap in np.array_split(np.arange(rows - unique_rows), max(1, files - 1))]
+
+    os.makedirs(output_folder, exist_ok=True)
+    paths = []
+    for index, part in enumerate(parts):
+        if index:
+            part = np.concatenate([parts[index - 1][len(parts[index - 1]) - overlaps[index]:], part])
+        path = os.path.join(output_folder, f"aib_synthetic_{index + 1:03d}.csv")
+        frame.iloc[part].to_csv(path, index=False, quoting=csv.QUOTE_NONNUMERIC, float_format="%.2f")
+        paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic AIB statement CSVs.")
+    parser.add_argument("output_folder")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--merchants", type=int, default=500, help="Distinct descriptions")
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    parser.add_argument("--days", type=int, default=365, help="Date span of the statements")
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_statements(args.output_folder, args.rows, args.merchants, args.duplicate_rate,
+                                args.days, args.files, seed=args.seed)
+    print(f"Wrote {args.rows} rows to {len(paths)} file(s) in {args.output_folder}.")
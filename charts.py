@@ -0,0 +1,208 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from converter.money import from_cents, is_cents
+from grapher import figure_jpeg, new_figure
+
+# Categories shown on their own in the spend chart; the rest are added up as "Other"
+MAX_CATEGORIES = 9
+
+# Per-chunk aggregates kept before they are folded together
+MAX_PARTS = 32
+
+class ChartAccumulator:
+    def __init__(self, matcher, top_merchants=10):
+        """
+        Aggregate the data of the report charts from one or more chunks of universal transactions.
+
+        Every chunk is reduced with a single groupby over (month, category, merchant), so the
+        work is linear in rows and only the aggregates are kept. A transaction counts towards
+        its winning rule, or else the first subcategory it matches in filter.json order, so
+        nothing is counted twice.
+
+        Args:
+            matcher (KeywordMatcher): The compiled filter.json, usually shared with the extractor.
+            top_merchants (int): Merchants shown in the top merchants chart.
+        """
+        self.matcher = matcher
+        self.top_merchants = top_merchants
+        self.parts = []
+
+        # Chart label of every (category, subcategory): the subcategory, qualified with its
+        # category when the same name is used under several categories, so they don't merge
+        targets = list(dict.fromkeys(matcher.targets + matcher.rules.targets))
+        categories = {}
+        for main_category, subcategory in targets:
+            categories.setdefault(subcategory, set()).add(main_category)
+        self.names = {(main_category, subcategory): subcategory if len(categories[subcategory]) == 1
+                      else f"{subcategory} ({main_category})" for main_category, subcategory in targets}
+
+    def label(self, description):
+        # Subcategory the description counts towards in the charts
+        matches = self.matcher.categorize(description)
+        return self.names[matches[0]] if matches else "Uncategorized"
+
+    def update(self, df):
+        """
+        Add a chunk of transactions.
+
+        Args:
+            df (pd.DataFrame): Universal transactions.
+        """
+        df = df.dropna(subset=['Date'])
+        if df.empty:
+            return
+        # Categorize each distinct description once; a missing one has code -1, the trailing ""
+        descriptions = df['Description'].astype('category')
+        names = np.append(descriptions.cat.categories.to_numpy(dtype=object).astype(str), "")
+        codes = descriptions.cat.codes.to_numpy()
+        labels = np.array([self.label(name) for name in names], dtype=object)[codes]
+        rules = self.matcher.rules.evaluate(df)
+        if (rules >= 0).any():
+            subcategories = np.array([self.names[target] for target in self.matcher.rules.targets], dtype=object)
+            labels = np.where(rules >= 0, subcategories[rules], labels)
+
+        expense, income = df['Expense'].to_numpy(), df['Income'].to_numpy()
+        if is_cents(expense):
+            expense, income = from_cents(expense), from_cents(income)
+        frame = pd.DataFrame({
+            "Month": df['Date'].to_numpy().astype('datetime64[M]'),
+            "Category": labels,
+            "Merchant": names[codes],
+            "Expense": expense,
+            "Income": income,
+        })
+        self.parts.append(frame.groupby(["Month", "Category", "Merchant"], sort=False)[["Expense", "Income"]].sum())
+        if len(self.parts) > MAX_PARTS:
+            self.parts = [self.totals()]
+
+    def totals(self):
+        # Fold the per-chunk aggregates into one
+        if not self.parts:
+            return pd.DataFrame(columns=["Expense", "Income"],
+                                index=pd.MultiIndex.from_tuples([], names=["Month", "Category", "Merchant"]))
+        return pd.concat(self.parts).groupby(level=[0, 1, 2], sort=False).sum()
+
+    def result(self):
+        """
+        Build the chart tables from the aggregates.
+
+        Returns:
+            dict: See chart_tables.
+        """
+        return chart_tables(self.totals(), self.top_merchants)
+
+def chart_tables(totals, top_merchants=10, start=None, end=None):
+    """
+    Build the chart tables from monthly (month, category, merchant) totals.
+
+    Args:
+        totals (pd.DataFrame): ChartAccumulator.totals().
+        top_merchants (int): Merchants shown in the top merchants chart.
+        start (pd.Period, optional): First month to include.
+        end (pd.Period, optional): Last month to include.
+
+    Returns:
+        dict: "Category Spend" (month x category expenses), "Cashflow" (monthly Income and
+        Expenses) and "Top Merchants" (expenses of the biggest merchants, largest first).
+    """
+    if start is not None and len(totals):
+        # The totals are monthly partitions already, so a period is a slice of them
+        months = np.asarray(totals.index.get_level_values("Month"), dtype='datetime64[M]')
+        totals = totals[(months >= np.datetime64(str(start), 'M')) & (months <= np.datetime64(str(end), 'M'))]
+    category_spend = totals["Expense"].groupby(level=["Month", "Category"]).sum().unstack(fill_value=0)
+    category_spend = category_spend.loc[:, category_spend.sum() > 0]
+    if category_spend.shape[1] > MAX_CATEGORIES:
+        order = category_spend.sum().sort_values(ascending=False).index
+        other = category_spend[order[MAX_CATEGORIES - 1:]].sum(axis=1)
+        category_spend = category_spend[order[:MAX_CATEGORIES - 1]].assign(Other=other)
+    else:
+        category_spend = category_spend[category_spend.sum().sort_values(ascending=False).index]
+    cashflow = totals.groupby(level="Month")[["Income", "Expense"]].sum().rename(columns={"Expense": "Expenses"})
+    merchants = totals["Expense"].groupby(level="Merchant").sum()
+    top_merchants = merchants[merchants > 0].sort_values(ascending=False, kind='stable').head(top_merchants)
+    return {"Category Spend": category_spend.sort_index(), "Cashflow": cashflow.sort_index(), "Top Merchants": top_merchants}
+
+def month_labels(months):
+    # "Oct-2024" style labels for a month index
+    return pd.DatetimeIndex(months).strftime('%b-%Y').tolist()
+
+def render_category_spend(table, currency):
+    # Stacked bars of the monthly spend per category
+    fig = new_figure()
+    ax = fig.add_subplot()
+    positions = np.arange(len(table))
+    bottom = np.zeros(len(table))
+    colors = [f"C{index}" for index in range(table.shape[1])]
+    for column, color in zip(table.columns, colors):
+        ax.bar(positions, table[column].to_numpy(), bottom=bottom, label=str(column), color=color)
+        bottom += table[column].to_numpy()
+    ax.set_xticks(positions, month_labels(table.index), rotation=30, ha='right')
+    ax.set_xlabel('Month', size=13)
+    ax.set_ylabel('Spent in ' + currency, size=13, labelpad=20)
+    ax.set_title('Monthly Spending by Category', size=15)
+    ax.grid(True, axis='y')
+    ax.legend()
+    return figure_jpeg(fig)
+
+def render_cashflow(table, currency):
+    # Income and expense bars side by side, with the net cashflow as a line
+    fig = new_figure()
+    ax = fig.add_subplot()
+    positions = np.arange(len(table))
+    ax.bar(positions - 0.2, table["Income"].to_numpy(), width=0.4, color='seagreen', label='Income')
+    ax.bar(positions + 0.2, table["Expenses"].to_numpy(), width=0.4, color='indianred', label='Expenses')
+    ax.plot(positions, (table["Income"] - table["Expenses"]).to_numpy(), color='navy', marker='o', label='Cashflow')
+    ax.axhline(0, color='black', linewidth=0.8)
+    ax.set_xticks(positions, month_labels(table.index), rotation=30, ha='right')
+    ax.set_xlabel('Month', size=13)
+    ax.set_ylabel('Amount in ' + currency, size=13, labelpad=20)
+    ax.set_title('Monthly Cashflow', size=15)
+    ax.grid(True, axis='y')
+    ax.legend()
+    return figure_jpeg(fig)
+
+def render_top_merchants(series, currency):
+    # Horizontal bars, the biggest merchant on top
+    fig = new_figure()
+    ax = fig.add_subplot()
+    positions = np.arange(len(series))
+    ax.barh(positions, series.to_numpy(), color='cornflowerblue')
+    ax.set_yticks(positions, [str(name) for name in series.index])
+    ax.invert_yaxis()
+    ax.set_xlabel('Spent in ' + currency, size=13)
+    ax.set_title(f'Top {len(series)} Merchants', size=15)
+    ax.grid(True, axis='x')
+    return figure_jpeg(fig)
+
+# Chart pages of the report: (page title, result table, renderer, exported file name)
+CHARTS = [
+    ("Spending by Category", "Category Spend", render_category_spend, "chart_category_spend.jpg"),
+    ("Monthly Cashflow", "Cashflow", render_cashflow, "chart_cashflow.jpg"),
+    ("Top Merchants", "Top Merchants", render_top_merchants, "chart_top_merchants.jpg"),
+]
+
+def create_charts(chart_data, currency, output_dir=None):
+    """
+    Render the report charts.
+
+    Args:
+        chart_data (dict): The result of ChartAccumulator.
+        currency (str): The currency shown on the axis labels.
+        output_dir (str, optional): Also save every chart as a JPEG in this folder.
+
+    Returns:
+        list of tuple: (page title, io.BytesIO JPEG) for each chart with data, in page order.
+    """
+    charts = []
+    for title, key, render, file_name in CHARTS:
+        table = chart_data[key]
+        if table.empty:
+            continue  # Nothing to draw, e.g. no expenses
+        image = render(table, currency)
+        if output_dir:
+            with open(os.path.join(output_dir, file_name), 'wb') as f:
+                f.write(image)
+        charts.append((title, io.BytesIO(image)))
+    return charts
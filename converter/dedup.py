@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Name of the index holding each transaction's fingerprint
+FINGERPRINT = "Fingerprint"
+
+def fingerprints(df, carry=None):
+    """
+    Compute a stable 64-bit fingerprint per transaction.
+
+    The fingerprint hashes the account, date, signed amount, running balance and description,
+    plus the row's occurrence among identical rows of the same file. The same payment
+    exported twice gets the same fingerprint; two identical payments on one day don't.
+
+    Args:
+        df (pd.DataFrame): Universal transactions of one file, in file order.
+        carry (dict, optional): Occurrence counts left by the previous chunk of the same file;
+            updated in place, so identical rows split over two chunks keep counting.
+
+    Returns:
+        np.ndarray: uint64 fingerprints, one per row.
+    """
+    # Amounts in exact cents, so float formatting never splits a transaction
+    amount = np.rint((df["Income"].to_numpy(dtype=float) - df["Expense"].to_numpy(dtype=float)) * 100)
+    balance = np.rint(df["Balance"].to_numpy(dtype=float) * 100)
+    key = pd.DataFrame({
+        "Account": df["Account"].astype(str).to_numpy(),
+        "Date": df["Date"].to_numpy(),
+        "Amount": amount.astype(np.int64),
+        "Balance": balance.astype(np.int64),
+        "Description": df["Description"].astype(object).to_numpy(),
+    })
+    base = pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+    # The nth identical row of a file is its own transaction
+    occurrence = pd.Series(base).groupby(base, sort=False).cumcount().to_numpy()
+    if carry is not None:
+        if carry:
+            occurrence = occurrence + pd.Series(base).map(carry).fillna(0).to_numpy(dtype=np.int64)
+        # Only the latest chunk's counts are kept; statements list a day's rows together
+        counts = pd.Series(occurrence + 1).groupby(base, sort=False).max()
+        carry.clear()
+        carry.update(zip(counts.index.tolist(), counts.tolist()))
+    return pd.util.hash_pandas_object(pd.DataFrame({"Key": base, "Occurrence": occurrence}), index=False).to_numpy()
+
+def with_fingerprints(df, carry=None):
+    # The same rows, indexed by their fingerprints (see fingerprints)
+    return df.set_axis(pd.Index(fingerprints(df, carry), name=FINGERPRINT), axis=0)
+
+def drop_duplicates(df):
+    """
+    Keep the first row of every fingerprint, in one hash pass.
+
+    Args:
+        df (pd.DataFrame): Transactions indexed by fingerprint, in file order.
+
+    Returns:
+        pd.DataFrame: The rows whose fingerprint wasn't seen before.
+    """
+    return df[~df.index.duplicated(keep='first')]
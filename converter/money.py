@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# Universal columns holding money
+AMOUNT_COLUMNS = ["Expense", "Income", "Balance"]
+
+def is_cents(values):
+    # Money held as int64 cents rather than float currency units
+    return pd.api.types.is_integer_dtype(values)
+
+def to_cents(values):
+    """
+    Convert currency amounts to exact int64 cents.
+
+    Bank amounts have at most two decimals, so rounding the scaled float recovers
+    the exact cent value for any realistic balance.
+
+    Args:
+        values (array-like): Amounts in currency units.
+
+    Returns:
+        np.ndarray: int64 cents.
+    """
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+def from_cents(cents):
+    """
+    Convert int64 cents back to currency units.
+
+    Args:
+        cents (int or array-like): Amounts in cents.
+
+    Returns:
+        float or np.ndarray: The nearest float to each decimal amount, e.g. 6423.94.
+    """
+    if np.ndim(cents) == 0:
+        return int(cents) / 100
+    return np.asarray(cents, dtype=np.int64) / 100
+
+def amounts_to_cents(df):
+    # Universal DataFrame with its amount columns as int64 cents
+    casts = {column: to_cents(df[column]) for column in AMOUNT_COLUMNS if column in df.columns and not is_cents(df[column])}
+    return df.assign(**casts) if casts else df
+
+def amounts_to_currency(df):
+    # Universal DataFrame with its amount columns back in currency units, e.g. for a CSV export
+    casts = {column: from_cents(df[column]) for column in AMOUNT_COLUMNS if column in df.columns and is_cents(df[column])}
+    return df.assign(**casts) if casts else df
+
+def format_cents(cents):
+    """
+    Format int cents like f"{amount:,.2f}".
+
+    Args:
+        cents (int): Amount in cents.
+
+    Returns:
+        str: e.g. "-1,234.50"
+    """
+    cents = int(cents)
+    sign = "-" if cents < 0 else ""
+    whole, fraction = divmod(abs(cents), 100)
+    return f"{sign}{whole:,}.{fraction:02d}"
+
+def format_money(amount):
+    """
+    Format an amount in currency units like f"{amount:,.2f}", going through exact cents.
+
+    Args:
+        amount (float or int): Amount in currency units.
+
+    Returns:
+        str: e.g. "-1,234.50"
+    """
+    return format_cents(round(float(amount) * 100))
@@ -0,0 +1,69 @@
+import json
+from converter.money import AMOUNT_COLUMNS, is_cents
+
+# Column order of the universal transaction table
+UNIVERSAL_COLUMNS = ["Date", "Description", "Expense", "Income", "Balance", "Account", "Bank"]
+
+# Typed universal schema, kept by every stage after ingestion. Amounts may also be
+# int64 cents when the exact money mode is on (see converter/money.py)
+UNIVERSAL_DTYPES = {
+    "Date": "datetime64[ns]",
+    "Description": "category",
+    "Expense": "float64",
+    "Income": "float64",
+    "Balance": "float64",
+    "Account": "category",
+    "Bank": "category",
+}
+
+# Date format of banks.json mappings that don't declare one
+DEFAULT_DATE_FORMAT = "%d/%m/%Y"
+
+# Date format of the universal CSV and categorized_data.json
+ISO_DATE_FORMAT = "%Y-%m-%d"
+
+def load_bank_formats(mapping_file):
+    """
+    Load banks.json into one entry per bank with its header mapping and date format.
+
+    A bank is either declared as {"Date_Format": ..., "Headers": {...}} or, like older
+    files, as a flat {bank header: universal column} mapping using DEFAULT_DATE_FORMAT.
+
+    Args:
+        mapping_file (str): The JSON file containing the header mappings.
+
+    Returns:
+        dict: {bank: {"headers": {bank header: universal column}, "date_format": str}}
+    """
+    with open(mapping_file, 'r') as f:
+        mappings = json.load(f)
+    formats = {}
+    for bank, mapping in mappings.items():
+        if isinstance(mapping.get("Headers"), dict):
+            formats[bank] = {
+                "headers": mapping["Headers"],
+                "date_format": mapping.get("Date_Format", DEFAULT_DATE_FORMAT)
+            }
+        else:
+            formats[bank] = {"headers": mapping, "date_format": DEFAULT_DATE_FORMAT}
+    return formats
+
+def enforce_schema(df):
+    """
+    Cast a universal DataFrame to the typed schema, in the universal column order.
+
+    Columns that are already of the right type are left alone, so this is cheap to
+    call again after a concat or a merge. Amounts already held as int64 cents are kept.
+
+    Args:
+        df (pd.DataFrame): Universal transactions.
+
+    Returns:
+        pd.DataFrame: The same rows with UNIVERSAL_DTYPES applied.
+    """
+    columns = [column for column in UNIVERSAL_COLUMNS if column in df.columns]
+    df = df[columns]
+    casts = {column: dtype for column, dtype in UNIVERSAL_DTYPES.items()
+             if column in df.columns and str(df[column].dtype) != dtype
+             and not (column in AMOUNT_COLUMNS and is_cents(df[column]))}
+    return df.astype(casts) if casts else df
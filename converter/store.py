@@ -0,0 +1,237 @@
+import hashlib
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from converter.schema import ISO_DATE_FORMAT, enforce_schema
+from converter.validation import QUARANTINE_COLUMNS
+
+# Every stored row, keeping the first-ingested row of each fingerprint, in date order
+LOAD_QUERY = """
+    SELECT date AS Date, description AS Description, expense AS Expense, income AS Income, balance AS Balance,
+           account AS Account, bank AS Bank
+    FROM transactions
+    WHERE id IN (SELECT MIN(id) FROM transactions GROUP BY fingerprint)
+    ORDER BY date IS NULL, date, id
+"""
+
+def file_hash(path):
+    # SHA-256 of a file, read in blocks so large statements don't sit in memory
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TransactionStore:
+    def __init__(self, db_file, parser=""):
+        """
+        Persistent SQLite store of universal transactions plus a manifest of ingested files.
+
+        Every row keeps the file it came from, so a changed or deleted statement can be
+        replaced without touching the rest of the history. The rows a file had rejected
+        are kept with it, so the quarantine covers unchanged files too. Duplicates across files are
+        resolved at read time through an index on the transaction fingerprint.
+
+        Args:
+            db_file (str): Path of the SQLite database; created if missing.
+            parser (str): Digest of everything besides the file that decides its rows, such as
+                banks.json and the parser version; files ingested under another digest are
+                parsed again.
+        """
+        self.db_file = db_file
+        self.parser = parser
+        self.connection = sqlite3.connect(db_file)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha256 TEXT NOT NULL,
+                parser TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                date TEXT,
+                description TEXT,
+                expense REAL,
+                income REAL,
+                balance REAL,
+                account TEXT NOT NULL DEFAULT '',
+                bank TEXT NOT NULL DEFAULT '',
+                fingerprint INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS rejected (
+                source TEXT NOT NULL,
+                row INTEGER,
+                reason TEXT NOT NULL,
+                date TEXT,
+                description TEXT,
+                expense TEXT,
+                income TEXT,
+                balance TEXT,
+                account TEXT
+            );
+        """)
+        # Stores written by older versions lack the account, bank or fingerprint columns;
+        # add them and forget the manifest so every file is re-ingested with them filled in
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(transactions)")}
+        missing = {"account": "TEXT NOT NULL DEFAULT ''", "bank": "TEXT NOT NULL DEFAULT ''", "fingerprint": "INTEGER"}
+        if not set(missing) <= columns:
+            with self.connection:
+                for column, definition in missing.items():
+                    if column not in columns:
+                        self.connection.execute(f"ALTER TABLE transactions ADD COLUMN {column} {definition}")
+                self.connection.execute("DELETE FROM transactions")
+                self.connection.execute("DELETE FROM files")
+        # Manifests without a parser digest match no parser, so their files are parsed again
+        if "parser" not in {row[1] for row in self.connection.execute("PRAGMA table_info(files)")}:
+            with self.connection:
+                self.connection.execute("ALTER TABLE files ADD COLUMN parser TEXT NOT NULL DEFAULT ''")
+        self.connection.executescript("""
+            DROP INDEX IF EXISTS transactions_key;
+            DROP INDEX IF EXISTS transactions_account_key;
+            CREATE INDEX IF NOT EXISTS transactions_source ON transactions (source);
+            CREATE INDEX IF NOT EXISTS transactions_fingerprint ON transactions (fingerprint, id);
+            CREATE INDEX IF NOT EXISTS rejected_source ON rejected (source);
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def changed_files(self, csv_files):
+        """
+        Compare the input files against the manifest.
+
+        Size and mtime are checked first; a file is only hashed when they differ. A file
+        ingested under another parser digest counts as changed, whatever its content.
+
+        Args:
+            csv_files (list of str): The CSV files currently in the input folder.
+
+        Returns:
+            tuple: (new or changed files as {path: (size, mtime, sha256)}, removed paths,
+            unchanged files whose mtime moved as {path: (size, mtime, sha256)})
+        """
+        known = {path: (size, mtime, sha256, parser) for path, size, mtime, sha256, parser
+                 in self.connection.execute("SELECT path, size, mtime, sha256, parser FROM files")}
+        changed, touched = {}, {}
+        for path in csv_files:
+            stat = os.stat(path)
+            entry = known.get(path)
+            if entry and entry[3] != self.parser:
+                entry = None  # Read under other mappings; its stored rows may be wrong
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+                continue
+            sha256 = file_hash(path)
+            if entry and entry[2] == sha256:
+                touched[path] = (stat.st_size, stat.st_mtime, sha256)
+            else:
+                changed[path] = (stat.st_size, stat.st_mtime, sha256)
+        current = set(csv_files)
+        removed = [path for path in known if path not in current]
+        return changed, removed, touched
+
+    def sync(self, csv_files, parse_files, rejected_rows=None):
+        """
+        Bring the store up to date with the input folder.
+
+        Only new or changed files are parsed; rows of changed and removed files are replaced.
+
+        Args:
+            csv_files (list of str): The CSV files currently in the input folder.
+            parse_files (callable): Turns a list of CSV paths into universal DataFrames, in order;
+                each item may also be an iterable of DataFrame chunks.
+            rejected_rows (callable, optional): Returns the quarantine entries of a file once it
+                was parsed (see converter/validation.py), stored in place of its earlier ones.
+
+        Returns:
+            list of str: The files that were (re-)ingested.
+        """
+        changed, removed, touched = self.changed_files(csv_files)
+        with self.connection:
+            for path in removed:
+                self.connection.execute("DELETE FROM transactions WHERE source = ?", (path,))
+                self.connection.execute("DELETE FROM rejected WHERE source = ?", (path,))
+                self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            for path, (size, mtime, sha256) in touched.items():
+                self.connection.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (size, mtime, path))
+        for (path, (size, mtime, sha256)), parsed in zip(changed.items(), parse_files(list(changed))):
+            chunks = [parsed] if isinstance(parsed, pd.DataFrame) else parsed
+            # One transaction per file, so a failed parse never leaves half a statement behind
+            with self.connection:
+                self.connection.execute("DELETE FROM transactions WHERE source = ?", (path,))
+                for df in chunks:
+                    self.connection.executemany(
+                        "INSERT INTO transactions (source, date, description, expense, income, balance, account, bank, fingerprint) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        self._rows(path, df)
+                    )
+                self.connection.execute("DELETE FROM rejected WHERE source = ?", (path,))
+                if rejected_rows is not None:
+                    rejected = rejected_rows(path)
+                    self.connection.executemany(
+                        "INSERT INTO rejected (source, row, reason, date, description, expense, income, balance, account) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rejected[QUARANTINE_COLUMNS].astype(object).where(rejected[QUARANTINE_COLUMNS].notna(), None)
+                        .itertuples(index=False, name=None)
+                    )
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO files (path, size, mtime, sha256, parser) VALUES (?, ?, ?, ?, ?)",
+                    (path, size, mtime, sha256, self.parser)
+                )
+        return list(changed)
+
+    @staticmethod
+    def _rows(path, df):
+        # Universal DataFrame indexed by fingerprint -> SQLite row tuples
+        dates = df["Date"].dt.strftime(ISO_DATE_FORMAT).astype(object).where(df["Date"].notna(), None)
+        return zip(
+            [path] * len(df),
+            dates,
+            df["Description"].astype(object).where(df["Description"].notna(), None),
+            df["Expense"].astype(float),
+            df["Income"].astype(float),
+            df["Balance"].astype(float),
+            df["Account"].astype(str),
+            df["Bank"].astype(str),
+            # SQLite integers are signed 64-bit, so the unsigned fingerprint is stored bit for bit
+            np.asarray(df.index, dtype=np.uint64).view(np.int64).tolist()
+        )
+
+    def load_rejected(self):
+        """
+        Read the rejected rows of every stored file.
+
+        Returns:
+            pd.DataFrame: Quarantine entries in QUARANTINE_COLUMNS, in file and row order.
+        """
+        columns = ", ".join(f"{column.lower()} AS {column}" if column != "File" else "source AS File"
+                            for column in QUARANTINE_COLUMNS)
+        return pd.read_sql_query(f"SELECT {columns} FROM rejected ORDER BY source, row", self.connection)
+
+    def load(self):
+        """
+        Read every stored transaction, keeping the first-ingested row of each fingerprint.
+
+        Returns:
+            pd.DataFrame: Universal transactions sorted by date.
+        """
+        df = pd.read_sql_query(LOAD_QUERY, self.connection)
+        df['Date'] = pd.to_datetime(df['Date'], format=ISO_DATE_FORMAT)
+        return enforce_schema(df)
+
+    def iter_load(self, chunksize):
+        """
+        Read the stored transactions like ``load``, one chunk at a time.
+
+        Args:
+            chunksize (int): Rows per chunk.
+
+        Yields:
+            pd.DataFrame: Universal transactions sorted by date.
+        """
+        for df in pd.read_sql_query(LOAD_QUERY, self.connection, chunksize=chunksize):
+            df['Date'] = pd.to_datetime(df['Date'], format=ISO_DATE_FORMAT)
+            yield enforce_schema(df)
@@ -0,0 +1,104 @@
+import heapq
+import os
+import pickle
+import tempfile
+import pandas as pd
+from converter.schema import enforce_schema
+
+# Runs merged at once. More runs than this are first merged into intermediate runs, so the
+# open files and the blocks held in memory stay bounded however many chunks there are.
+MERGE_FAN_IN = 64
+
+def _entries(df, index):
+    # (sort key, fingerprint, row) of every row of a sorted chunk
+    dates = df['Date']
+    keys = zip(dates.isna().tolist(), dates.fillna(pd.Timestamp(0)).tolist())
+    rows = zip(keys, df.index.tolist(), df.itertuples(index=False, name=None))
+    for position, ((missing, date), fingerprint, row) in enumerate(rows):
+        # NaT sorts last like sort_values; ties keep chunk order, then row order
+        yield (missing, date, index, position), fingerprint, row
+
+def _write_run(entries, directory, name, block_rows):
+    # Spill sorted entries to disk as a sequence of pickled blocks
+    path = os.path.join(directory, f"{name}.pkl")
+    with open(path, 'wb') as f:
+        block = []
+        for entry in entries:
+            block.append(entry)
+            if len(block) >= block_rows:
+                pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+def _read_run(path):
+    # Yield the entries of a run, one block in memory at a time
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+def external_sort(chunks, chunksize):
+    """
+    Sort universal transaction chunks by date and drop duplicates with bounded memory.
+
+    Every chunk is sorted and spilled to a temporary run file, then the runs are merged
+    with k-way heap merges of at most MERGE_FAN_IN runs, in as many passes as needed.
+    Runs are read in blocks of chunksize // MERGE_FAN_IN rows, so a merge holds about one
+    chunk in memory. Duplicates share a date, so only the fingerprints of the current
+    date are held for deduplication.
+
+    Args:
+        chunks (iterable of pd.DataFrame): Universal transactions in any order, indexed by
+            fingerprint (see converter/dedup.py).
+        chunksize (int): Rows per yielded chunk.
+
+    Yields:
+        pd.DataFrame: Deduplicated transactions in ascending date order.
+    """
+    with tempfile.TemporaryDirectory(prefix="miabudget-") as directory:
+        block_rows = max(1, chunksize // MERGE_FAN_IN)
+        runs = []
+        names = None
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            names = list(chunk.columns)
+            chunk = chunk.sort_values(by='Date', kind='stable')
+            runs.append(_write_run(_entries(chunk, len(runs)), directory, f"run{len(runs)}", block_rows))
+        if not runs:
+            return
+
+        # Entries keep their original sort key, so intermediate merges don't change the order
+        passes = 0
+        while len(runs) > MERGE_FAN_IN:
+            merged = []
+            for start in range(0, len(runs), MERGE_FAN_IN):
+                group = runs[start:start + MERGE_FAN_IN]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                name = f"merge{passes}-{len(merged)}"
+                merged.append(_write_run(heapq.merge(*map(_read_run, group)), directory, name, block_rows))
+                for path in group:
+                    os.remove(path)
+            runs, passes = merged, passes + 1
+
+        current_date, seen = None, set()
+        batch = []
+        for (missing, date, _, _), fingerprint, row in heapq.merge(*map(_read_run, runs)):
+            if (missing, date) != current_date:
+                current_date, seen = (missing, date), set()
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield enforce_schema(pd.DataFrame.from_records(batch, columns=names))
+                batch = []
+        if batch:
+            yield enforce_schema(pd.DataFrame.from_records(batch, columns=names))
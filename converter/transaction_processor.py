@@ -1,104 +1,399 @@
+import csv
+import hashlib
 import json
+import os
 import pandas as pd
 import glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from converter.dedup import drop_duplicates, with_fingerprints
+from converter.money import amounts_to_cents
+from converter.schema import enforce_schema, load_bank_formats
+from converter.store import TransactionStore
+from converter.streaming import external_sort
+from converter.validation import QUARANTINE_COLUMNS, rejected_file, rejected_rows, report_quarantine, row_reasons
+
+# Universal columns holding amounts; their bank headers get cleaned to numbers
+NUMERIC_COLUMNS = ["Expense", "Income", "Balance"]
+
+# Bump when parsing or validation changes which rows a statement turns into; the store re-reads every file
+PARSER_VERSION = "2"
 
 class TransactionProcessor:
-    def __init__(self, input_folder, output_file, mapping_file, bank="default"):
+    def __init__(self, input_folder, output_file, mapping_file, bank="default", store_file=None,
+                 workers=1, executor="process", engine="c", cents=False, quarantine_file=None):
         """
         Initialize the TransactionProcessor with the input folder, output file path, and mappings.
 
+        Every file's bank is detected from its header row, so statements of several banks
+        and accounts can sit in the input folder together.
+
         Args:
             input_folder (str): The folder containing the CSV files to process.
-            output_file (str): The path to save the processed universal CSV file.
+            output_file (str): The path to save the processed universal CSV file, or None to keep it in memory.
             mapping_file (str): The JSON file containing the header mappings.
-            bank (str): The key identifying the bank's mapping in the JSON file.
+            bank (str): The preferred bank key when a header row fits several mappings.
+            store_file (str, optional): SQLite transaction store; when set, only new or changed
+                CSV files are parsed and merged into it.
+            workers (int): Number of CSV files parsed at once; 1 reads them one after another.
+            executor (str): "process" or "thread" pool for the parallel loader.
+            engine (str): pandas CSV engine, e.g. "c" or "pyarrow".
+            cents (bool): Hand out Expense, Income and Balance as exact int64 cents instead of floats.
+            quarantine_file (str, optional): CSV receiving the rejected rows with their reasons;
+                without it the rejected rows are only counted.
         """
         self.input_folder = input_folder
         self.output_file = output_file
         self.bank = bank
+        self.store_file = store_file
+        self.workers = workers
+        self.executor = executor
+        self.engine = engine
+        self.cents = cents
+        self.quarantine_file = quarantine_file
+        self.banks = {}  # File -> bank key, detected once per file
+        self.rejected = []  # Quarantine entries of rejected rows (see converter/validation.py)
+        self.skipped = []  # Quarantine entries of files no bank matches
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unknown executor '{executor}', use 'process' or 'thread'.")
+
+        # Load header mappings and date formats from JSON
+        self.formats = load_bank_formats(mapping_file)
+
+        # Stored rows are only valid for the mappings and parser that produced them
+        self.parser = hashlib.sha256(json.dumps([PARSER_VERSION, self.formats], sort_keys=True).encode("utf-8")).hexdigest()
+
+        # Header-signature index: the header set each bank needs, most specific first
+        self.signatures = sorted(
+            ((frozenset(bank_format["headers"]), name) for name, bank_format in self.formats.items()),
+            key=lambda signature: -len(signature[0])
+        )
+
+    def detect_bank(self, file):
+        """
+        Find the banks.json mapping whose headers all appear in a file's header row.
+
+        Args:
+            file (str): Path of the CSV file.
+
+        Returns:
+            str: The bank key. When several mappings fit, the one with the most headers wins,
+            and on a tie the preferred bank from settings.json.
+
+        Raises:
+            ValueError: If no mapping fits the header row.
+        """
+        with open(file, 'r', newline='', encoding='utf-8-sig') as f:
+            header = frozenset(next(csv.reader(f), []))
+        matches = [(headers, name) for headers, name in self.signatures if headers <= header]
+        if not matches:
+            raise ValueError(f"No bank in banks.json matches the headers of {file}: {sorted(header)}")
+        best = [name for headers, name in matches if len(headers) == len(matches[0][0])]
+        return self.bank if self.bank in best else best[0]
+
+    def readable_files(self, csv_path):
+        """
+        Check every file's header row against banks.json once, before reading any rows.
+
+        A file no bank matches is quarantined as a whole and left out, so one odd export
+        doesn't stop the run.
+
+        Args:
+            csv_path (list of str): Paths of the CSV files.
+
+        Returns:
+            list of str: The files with a known bank, in the order of csv_path.
+
+        Raises:
+            ValueError: If no file matches a bank.
+        """
+        readable = []
+        for file in csv_path:
+            try:
+                self.banks[file] = self.detect_bank(file)
+                readable.append(file)
+            except (ValueError, UnicodeDecodeError) as e:
+                self.skipped.append(rejected_file(file, str(e)))
+                print(f"Skipped {file}: {e}")
+        if not readable:
+            raise ValueError("No CSV file in the input folder matches a bank in banks.json, check if all your csv headers match.")
+        return readable
+
+    def bank_of(self, file):
+        # The bank detected by readable_files, or detected now for a file read on its own
+        return self.banks.get(file) or self.detect_bank(file)
+
+    def quarantine(self, rejected):
+        # Keep the rejected rows of a file or chunk for report_rejected
+        if rejected is not None and len(rejected):
+            self.rejected.append(rejected)
+
+    def rejected_of(self, file):
+        # The rejected rows collected for one file, e.g. for the store to keep with it
+        rows = [rejected for rejected in self.rejected if rejected["File"].iat[0] == file]
+        return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=QUARANTINE_COLUMNS)
+
+    def sync_store(self, store, csv_path, parse_files):
+        """
+        Merge new or changed files into the store, and take the quarantine of every current file from it.
 
-        # Load header mappings from JSON
-        with open(mapping_file, 'r') as f:
-            mappings = json.load(f)
+        Returns:
+            list of str: The files that were (re-)ingested.
+        """
+        ingested = store.sync(csv_path, parse_files, self.rejected_of)
+        self.rejected = [store.load_rejected()]
+        return ingested
+
+    def report_rejected(self):
+        """
+        Print how many rows were rejected and write them to the quarantine file.
 
-        # Ensure the bank mapping exists; otherwise, fall back to default
-        self.universal_columns = mappings.get(bank, mappings["default"])
-        self.headers = list(self.universal_columns.keys())
+        With a store this covers every current file, including the unchanged ones that were
+        not read again, so the quarantine never loses rows that are still left out.
+
+        Returns:
+            int: The rejected rows, not counting the skipped files.
+        """
+        return report_quarantine(self.quarantine_file, self.skipped, self.rejected)
+
+    def no_transactions(self):
+        # Message for a run where no row passed validation
+        where = f", see {self.quarantine_file} for the rejected rows" if self.quarantine_file else ""
+        return f"No valid transactions in the input files{where}."
 
     def load_csv_files(self):
         """
         Load and concatenate all CSV files in the input folder.
 
         Returns:
-            pd.DataFrame: Concatenated DataFrame from all CSV files.
+            pd.DataFrame: Concatenated universal DataFrame from all CSV files, in file order and
+            indexed by transaction fingerprint.
+        """
+        csv_path = self.readable_files(self.list_csv_files())
+        if self.workers > 1:
+            print(f"Loading {len(csv_path)} files on {self.workers} {self.executor} workers.")
+        # Categories differ per file, so the concat needs the schema applied again
+        return enforce_schema(pd.concat(self.parse_csv_files(csv_path)))
+
+    def list_csv_files(self):
         """
-        csv_path = glob.glob(f"{self.input_folder}/*.csv")  # Match all CSV files
+        List the CSV files in the input folder, in a stable order.
+
+        Returns:
+            list of str: Paths of the CSV files.
+        """
+        csv_path = sorted(glob.glob(f"{self.input_folder}/*.csv"))  # Match all CSV files
         if not csv_path:
             raise FileNotFoundError("No CSV files found in the input folder!")
-        print(f"Files for bank '{self.bank}' loaded.")
-        print("If you get errors below, check if all your csv headers match")
-        return pd.concat(
-            [pd.read_csv(file, usecols=self.headers, dtype=str) for file in csv_path],
-            ignore_index=True
-        )
+        return csv_path
 
-    @staticmethod
-    def clean_numeric_columns(df, columns):
+    def normalize(self, df, bank, file):
         """
-        Clean numeric columns by removing commas and converting to numeric values.
+        Validate, clean, rename and date-parse raw bank rows into the universal layout.
+
+        Amounts and dates are parsed on whole columns. A row is rejected when its date is
+        missing or doesn't match the bank's format, or when an amount is not a number;
+        blank amounts are valid and count as 0.
 
         Args:
-            df (pd.DataFrame): DataFrame containing the columns to clean.
-            columns (list of str): List of column names to clean.
+            df (pd.DataFrame): Raw rows read with the bank's headers, indexed by data row.
+            bank (str): The bank key of the rows' mapping.
+            file (str): The file the rows came from; names the account when the bank has no account column.
 
         Returns:
-            pd.DataFrame: Updated DataFrame with cleaned numeric columns.
+            tuple: (pd.DataFrame of the valid rows in the typed universal schema, tagged with
+            Account and Bank; pd.DataFrame of the rejected rows, or None when all are valid).
         """
-        for column in columns:
-            df[column] = pd.to_numeric(df[column].str.replace(',', '', regex=True), errors='coerce').fillna(0)
-        return df
+        mapping = self.formats[bank]["headers"]
+        date_format = self.formats[bank]["date_format"]
+        date_header = next(header for header, column in mapping.items() if column == 'Date')
+
+        # Parse amounts and dates; values that don't parse come out as NaN and NaT
+        numeric_columns = [header for header, column in mapping.items() if column in NUMERIC_COLUMNS]
+        amounts = {header: pd.to_numeric(df[header].str.replace(',', '', regex=False), errors='coerce')
+                   for header in numeric_columns}
+        dates = pd.to_datetime(df[date_header], format=date_format, errors='coerce')
+
+        checks = [("Missing date", df[date_header].isna()),
+                  (f"Date is not {date_format}", dates.isna() & df[date_header].notna())]
+        checks += [(f"{header.strip()} is not a number", values.isna() & df[header].notna()) for header, values in amounts.items()]
+        reasons = row_reasons(checks)
+        rejected = None
+        if reasons is not None:
+            rejected = rejected_rows(df, mapping, reasons, file)
+            keep = reasons == ""
+            df, dates, amounts = df[keep], dates[keep], {header: values[keep] for header, values in amounts.items()}
+
+        # Rename and select universal columns
+        universal_df = df.assign(**{header: values.fillna(0).astype('float64') for header, values in amounts.items()})
+        universal_df = universal_df.rename(columns=mapping)
+        universal_df['Date'] = dates.to_numpy()
+
+        # Tag every row with its account and bank
+        if 'Account' in universal_df.columns:
+            universal_df['Account'] = universal_df['Account'].fillna("").astype(str).str.strip()
+        else:
+            universal_df['Account'] = os.path.splitext(os.path.basename(file))[0]
+        universal_df['Bank'] = bank
+        return enforce_schema(universal_df), rejected
+
+    def read_csv_file(self, file):
+        """
+        Read, validate and normalize a single CSV file with its own bank's mapping.
+
+        Args:
+            file (str): Path of the CSV file.
+
+        Returns:
+            tuple: (pd.DataFrame of the file's valid rows in the universal layout, indexed by
+            transaction fingerprint; pd.DataFrame of its rejected rows, or None).
+        """
+        bank = self.bank_of(file)
+        df = pd.read_csv(file, usecols=list(self.formats[bank]["headers"]), dtype=str, engine=self.engine)
+        universal_df, rejected = self.normalize(df, bank, file)
+        return with_fingerprints(universal_df), rejected
+
+    def parse_csv_file(self, file):
+        """
+        Read and normalize a single CSV file, keeping its rejected rows for the quarantine.
+
+        Args:
+            file (str): Path of the CSV file.
+
+        Returns:
+            pd.DataFrame: The file's valid rows in the universal layout, indexed by transaction fingerprint.
+        """
+        universal_df, rejected = self.read_csv_file(file)
+        self.quarantine(rejected)
+        return universal_df
+
+    def parse_csv_files(self, csv_path):
+        """
+        Read and normalize several CSV files, on a worker pool when more than one worker is set.
+
+        Args:
+            csv_path (list of str): Paths of the CSV files.
+
+        Returns:
+            list of pd.DataFrame: One universal DataFrame per file, in the order of csv_path.
+        """
+        if self.workers <= 1 or len(csv_path) <= 1:
+            return [self.parse_csv_file(file) for file in csv_path]
+        pool = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+        with pool(max_workers=min(self.workers, len(csv_path))) as executor:
+            # map() yields in submission order, so the merge is deterministic
+            results = list(executor.map(self.read_csv_file, csv_path))
+        # Workers hand the rejected rows back, since they can't add to this processor's list
+        for universal_df, rejected in results:
+            self.quarantine(rejected)
+        return [universal_df for universal_df, rejected in results]
+
+    def iter_csv_file(self, file, chunksize):
+        """
+        Read and normalize a single CSV file in chunks.
+
+        Args:
+            file (str): Path of the CSV file.
+            chunksize (int): Rows per chunk.
+
+        Yields:
+            pd.DataFrame: Chunks of the file's rows in the universal layout, indexed by transaction fingerprint.
+        """
+        bank = self.bank_of(file)
+        # The pyarrow engine cannot read in chunks, so streaming always uses the C parser
+        engine = "c" if self.engine == "pyarrow" else self.engine
+        headers = list(self.formats[bank]["headers"])
+        carry = {}  # Identical rows keep counting across chunks
+        for chunk in pd.read_csv(file, usecols=headers, dtype=str, engine=engine, chunksize=chunksize):
+            # Chunks keep counting the row index, so rejected rows get their row in the file
+            universal_df, rejected = self.normalize(chunk, bank, file)
+            self.quarantine(rejected)
+            yield with_fingerprints(universal_df, carry)
+
+    def stream_transactions(self, chunksize):
+        """
+        Stream the universal transactions in date order without holding them all in memory.
+
+        With a store the changed files are merged into it chunk by chunk and read back in
+        chunks; otherwise the files go through an external merge sort.
+
+        Args:
+            chunksize (int): Rows per chunk.
+
+        Yields:
+            pd.DataFrame: Deduplicated universal transactions in ascending date order.
+        """
+        csv_path = self.readable_files(self.list_csv_files())
+        print(f"Streaming {len(csv_path)} files in chunks of {chunksize} rows.")
+        if self.store_file:
+            store = TransactionStore(self.store_file, self.parser)
+            try:
+                self.sync_store(store, csv_path, lambda files: (self.iter_csv_file(file, chunksize) for file in files))
+                self.report_rejected()
+                rows = 0
+                for batch in store.iter_load(chunksize):
+                    rows += len(batch)
+                    yield amounts_to_cents(batch) if self.cents else batch
+            finally:
+                store.close()
+        else:
+            chunks = (chunk for file in csv_path for chunk in self.iter_csv_file(file, chunksize))
+            rows = 0
+            for batch in external_sort(chunks, chunksize):
+                rows += len(batch)
+                yield amounts_to_cents(batch) if self.cents else batch
+            self.report_rejected()
+        if not rows:
+            raise ValueError(self.no_transactions())
+
+    def load_from_store(self):
+        """
+        Merge new or changed CSV files into the transaction store and read the full history back.
+
+        Returns:
+            pd.DataFrame: Deduplicated universal transactions sorted by date.
+        """
+        csv_path = self.readable_files(self.list_csv_files())
+        store = TransactionStore(self.store_file, self.parser)
+        try:
+            ingested = self.sync_store(store, csv_path, self.parse_csv_files)
+            print(f"Files loaded: {len(ingested)} new or changed, {len(csv_path) - len(ingested)} unchanged.")
+            return store.load()
+        finally:
+            store.close()
 
     def process_transactions(self):
         """
         Process the transactions by loading, cleaning, sorting, and saving the data.
 
         Returns:
-            None
+            pd.DataFrame: The universal transactions in the typed schema (see converter/schema.py).
         """
-        # Load and combine data from CSV files
-        df = self.load_csv_files()
+        if self.store_file:
+            # Only parse what changed; the store sorts and dedups through its index
+            universal_df = self.load_from_store()
+        else:
+            # Load and combine data from CSV files, each with its own bank's mapping
+            universal_df = self.load_csv_files()
 
-        # Clean numeric columns
-        numeric_columns = [' Credit Amount', ' Debit Amount', 'Balance']
-        df = self.clean_numeric_columns(df, numeric_columns)
+            # Merge overlapping exports: keep the first row of every transaction fingerprint
+            universal_df = drop_duplicates(universal_df)
 
-        # Rename and select universal columns
-        universal_df = df.rename(columns=self.universal_columns)
+            # Sort by date in ascending order; same-day rows keep their file order
+            universal_df = universal_df.sort_values(by='Date', kind='stable').reset_index(drop=True)
 
-        # Sort by date in ascending order
-        universal_df['Date'] = pd.to_datetime(universal_df['Date'], format='%d/%m/%Y', errors='coerce')
-        universal_df = universal_df.sort_values(by='Date').reset_index(drop=True)
-
-        # Remove rows with duplicate Date, Expense, Income, and Balance
-        universal_df = universal_df.drop_duplicates(subset=['Date', 'Expense', 'Income', 'Balance'], keep='first')
+        self.report_rejected()
+        if universal_df.empty:
+            raise ValueError(self.no_transactions())
+        banks = sorted(universal_df['Bank'].unique())
+        accounts = universal_df['Account'].nunique()
+        print(f"Files for bank(s) {', '.join(banks)} loaded: {accounts} account(s), {len(universal_df)} transactions.")
 
         # Save to a new CSV file
-        universal_df.to_csv(self.output_file, index=False)
-        print(f"Universal transactions saved successfully to {self.output_file}.")
-
-if __name__ == "__main__":
-    
-    with open("settings.json", "r") as f:
-        settings_data = json.load(f)
-    mybank = settings_data.get("Config", {}).get("Bank", "DefaultBank")  # Useful 
-    
-    processor = TransactionProcessor(
-        input_folder="input",
-        output_file="universal_transactions.csv",
-        mapping_file="banks.json",
-        bank=mybank  # Change to the desired bank key
-    )
-    try:
-        processor.process_transactions()
-    except FileNotFoundError as e:
-        print(e)
+        if self.output_file:
+            universal_df.to_csv(self.output_file, index=False)
+            print(f"Universal transactions saved successfully to {self.output_file}.")
+
+        # Exact money from here on; the CSV above stays in currency units
+        if self.cents:
+            universal_df = amounts_to_cents(universal_df)
+        return universal_df
@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Columns of the quarantine file: where a rejected row came from, why, and its values as read
+QUARANTINE_COLUMNS = ["File", "Row", "Reason", "Date", "Description", "Expense", "Income", "Balance", "Account"]
+
+def row_reasons(checks):
+    """
+    Combine whole-column checks into one reason per row.
+
+    Args:
+        checks (list of tuple): (reason, mask) pairs; the mask is True where a row fails.
+
+    Returns:
+        np.ndarray: The reasons of every row joined by "; ", "" for valid rows, or None
+        when every row passed (the common case, which costs one any() per check).
+    """
+    checks = [(reason, np.asarray(mask, dtype=bool)) for reason, mask in checks]
+    checks = [(reason, mask) for reason, mask in checks if mask.any()]
+    if not checks:
+        return None
+    reasons = np.full(len(checks[0][1]), "", dtype=object)
+    for reason, mask in checks:
+        current = reasons[mask]
+        reasons[mask] = np.where(current == "", reason, current + "; " + reason)
+    return reasons
+
+def rejected_rows(raw, mapping, reasons, file):
+    """
+    Build the quarantine entries of the rows that failed validation.
+
+    Args:
+        raw (pd.DataFrame): The rows as read, with the bank's headers, indexed by data row (from 0).
+        mapping (dict): Bank header -> universal column.
+        reasons (np.ndarray): Reason per row, "" for valid rows (see row_reasons).
+        file (str): The file the rows came from.
+
+    Returns:
+        pd.DataFrame: The rejected rows in QUARANTINE_COLUMNS.
+    """
+    failed = reasons != ""
+    rows = raw[failed].rename(columns=mapping)
+    rejected = pd.DataFrame({"File": file, "Row": rows.index + 1, "Reason": reasons[failed]})
+    for column in QUARANTINE_COLUMNS[3:]:
+        rejected[column] = rows[column].to_numpy() if column in rows.columns else ""
+    return rejected
+
+def rejected_file(file, reason):
+    # A quarantine entry for a whole file that couldn't be read
+    return pd.DataFrame([{"File": file, "Row": "", "Reason": reason}], columns=QUARANTINE_COLUMNS).fillna("")
+
+def report_quarantine(output_file, skipped, rejected):
+    """
+    Print how many rows of each file were rejected and write them to the quarantine file.
+
+    Args:
+        output_file (str): Path of the quarantine CSV, or None to only print the counts.
+        skipped (list of pd.DataFrame): Entries of the files that couldn't be read (see rejected_file).
+        rejected (list of pd.DataFrame): Entries of the rows that failed validation (see rejected_rows).
+
+    Returns:
+        int: The rejected rows, not counting the skipped files.
+    """
+    counts = {}
+    for entries in rejected:
+        for file, count in entries["File"].value_counts(sort=False).items():
+            counts[file] = counts.get(file, 0) + count
+    for file, count in counts.items():
+        print(f"Rejected {count} row(s) of {file}.")
+    if output_file:
+        write_quarantine(output_file, skipped + rejected)
+        if counts:
+            print(f"Rejected rows and their reasons saved to {output_file}.")
+    return sum(counts.values())
+
+def write_quarantine(output_file, rejected):
+    """
+    Write the rejected rows to a CSV file, or remove an old one when nothing was rejected.
+
+    Args:
+        output_file (str): Path of the quarantine CSV.
+        rejected (list of pd.DataFrame): Quarantine entries (see rejected_rows).
+    """
+    rejected = [entries for entries in rejected if len(entries)]
+    if rejected:
+        pd.concat(rejected, ignore_index=True).to_csv(output_file, index=False)
+    elif os.path.exists(output_file):
+        os.remove(output_file)
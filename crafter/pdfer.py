@@ -1,58 +1,79 @@
 import json
+import os
 from fpdf import FPDF
 import pandas as pd
 from datetime import datetime
 import csv
+from converter.money import format_cents, format_money
 
-# Get the current time and date
-now = datetime.now()
-formatted_time_date = now.strftime("%H:%M:%S,       %d, %b, %Y")  # Time and Date
-
-# Load and process date range from the CSV
-def load_date_range(csv_file):
-    df = pd.read_csv(csv_file)
-    df['Date'] = pd.to_datetime(df['Date'])
+# Load and process date range from the transactions DataFrame (or the CSV)
+def load_date_range(transactions):
+    if isinstance(transactions, pd.DataFrame):
+        df = transactions
+    else:
+        df = pd.read_csv(transactions)
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df = df.assign(Date=pd.to_datetime(df['Date'], format='%Y-%m-%d'))
     newest_date = df['Date'].max()
     oldest_date = df['Date'].min()
     return oldest_date.strftime("%d-%b-%Y"), newest_date.strftime("%d-%b-%Y")
 
+# Turn ISO date strings into report dates, parsing each distinct day only once
+def format_dates(date_strs):
+    unique_dates = pd.Index(pd.unique(pd.Series(list(date_strs), dtype=object)))
+    parsed = pd.to_datetime(unique_dates, format='%Y-%m-%d', errors='coerce')
+    formatted = parsed.strftime("%d, %b, %Y")
+    return {date_str: (text if isinstance(text, str) else "Invalid Date")
+            for date_str, text in zip(unique_dates, formatted)}
+
 # Load settings
-def load_settings():
-    with open("settings.json", "r") as file:
-        settings = json.load(file)
+def load_settings(settings=None):
+    if settings is None:
+        with open("settings.json", "r") as file:
+            settings = json.load(file)
     account_name = settings["Config"]["AccountName"]
     bank_format = settings["Config"]["Bank"]
     currency = settings["Config"]["Currency"]
     return account_name, bank_format, currency
 
-# Load Categorized Data Json
-def load_categorized_data():
+# Read the exported categorized data from whichever of the Json and the columnar export was written last,
+# so switching Categorized_Format or running the extractor on its own never brings back an older file
+def read_categorized_data(statistics_only=False):
+    exports = [file for file in ("categorized_data.json", "categorized_data.npz") if os.path.exists(file)]
+    if exports and max(exports, key=os.path.getmtime) == "categorized_data.npz":
+        from processor.columnar import read_columnar, read_statistics
+        if statistics_only:
+            return read_statistics("categorized_data.npz")  # Only the small sidecar, no rows
+        return read_columnar("categorized_data.npz")
     with open("categorized_data.json", "r") as file:
-        data = json.load(file)
-    total_income = f"{data['Statistics']['Total Income']:,.2f}"
-    total_expense = f"{data['Statistics']['Total Expenses']:,.2f}"
+        return json.load(file)
+
+# Load Categorized Data (from memory, or the export)
+def load_categorized_data(data=None):
+    if data is None:
+        data = read_categorized_data(statistics_only=True)
+    total_income = format_money(data['Statistics']['Total Income'])
+    total_expense = format_money(data['Statistics']['Total Expenses'])
     total_transactions = data["Statistics"]["Total Transactions"]
-    total_outcome = f"{(data['Statistics']['Total Income']) - (data['Statistics']['Total Expenses']):,.2f}"     # Outcome = Cashflow
-    starting_balance = data["Statistics"]["Starting Balance"]
-    ending_balance = data["Statistics"]["Ending Balance"]
+    total_outcome = format_cents(round(data['Statistics']['Total Income'] * 100) - round(data['Statistics']['Total Expenses'] * 100))     # Outcome = Cashflow, in exact cents
+    starting_balance = format_money(data["Statistics"]["Starting Balance"])
+    ending_balance = format_money(data["Statistics"]["Ending Balance"])
     daily_spending = data["Statistics"]["Average Daily Spending"]
     daily_income = data["Statistics"]["Average Daily Income"]
     
     most_expensive_day = data['Statistics'].get('Most Expensive Day', {})
     expensive_date = most_expensive_day.get('Date', 'N/A')
-    expensive_amount = f"{most_expensive_day.get('Amount', 0):,.2f}"
+    expensive_amount = format_money(most_expensive_day.get('Amount', 0))
     
     # Format the date if it's not 'N/A'
+    if expensive_date is None:
+        expensive_date = 'N/A'
     if expensive_date != 'N/A':
-        try:
-            parsed_date = datetime.strptime(expensive_date, "%Y-%m-%d")
-            expensive_date = parsed_date.strftime("%d, %b, %Y")  
-        except ValueError:
-            expensive_date = "Invalid Date"
+        expensive_date = format_dates([expensive_date])[expensive_date]
     
     total_item = data['Statistics'].get('Item with Highest Total Spending', {})
     total_item_desc = total_item.get('Description', 'N/A')
-    total_item_amount = f"{total_item.get('Total Amount', 'N/A'):,.2f}"
+    total_item_amount = format_money(total_item.get('Total Amount', 0))
     
     return total_income, total_expense, total_transactions, total_outcome, starting_balance, ending_balance, daily_spending, daily_income, expensive_date, expensive_amount, total_item_desc, total_item_amount
     
@@ -77,7 +98,7 @@ def add_disclaimer_page(pdf, w):
     pdf.multi_cell(w-50, 7, R"This budget app is a personal project designed to convert bank statements into easy-to-understand budget reports with graphs. While every effort has been made to ensure the accuracy of the generated PDF file, errors may occur in the processing of data. The viewer is advised to double-check the budget details and confirm the accuracy of the information presented. The app creator is not responsible for any financial errors or discrepancies resulting from the use of this tool.", border=0, align='J')
 
 # 2 Page
-def add_overview_page(pdf, w, oldest_date_str, newest_date_str, account_name, bank_format, currency, total_transactions, total_income, total_expense, total_outcome, starting_balance, ending_balance, daily_spending, daily_income, expensive_date, expensive_amount, total_item_desc, total_item_amount):
+def add_overview_page(pdf, w, oldest_date_str, newest_date_str, account_name, bank_format, currency, total_transactions, total_income, total_expense, total_outcome, starting_balance, ending_balance, daily_spending, daily_income, expensive_date, expensive_amount, total_item_desc, total_item_amount, formatted_time_date):
     pdf.add_page()
     pdf.set_xy(((w/2)-(70/2)), 13)                          # Header
     pdf.set_font('helvetica', 'B', 16)                      # Header
@@ -145,19 +166,19 @@ def add_overview_page(pdf, w, oldest_date_str, newest_date_str, account_name, ba
     pdf.cell(40, 10, 'Average Daily Income:', border=0, align='L')                    # Average Daily income
     pdf.set_font('helvetica', '', 13)                                                        # Average Daily income
     pdf.set_xy(70, 190)                                                                      # Average Daily income
-    pdf.cell(120, 10, str(daily_income) + " " + currency, border=0, align='C')              # Average Daily income
+    pdf.cell(120, 10, format_money(daily_income) + " " + currency, border=0, align='C')              # Average Daily income
     pdf.set_font('helvetica', 'B', 13)                                                  # Average Daily Spending
     pdf.set_xy(20, 200)                                                                 # Average Daily Spending
     pdf.cell(40, 10, 'Average Daily Spending:', border=0, align='L')                    # Average Daily Spending
     pdf.set_font('helvetica', '', 13)                                                        # Average Daily Spending
     pdf.set_xy(70, 200)                                                                      # Average Daily Spending
-    pdf.cell(120, 10, str(daily_spending) + " " + currency, border=0, align='C')              # Average Daily Spending
+    pdf.cell(120, 10, format_money(daily_spending) + " " + currency, border=0, align='C')              # Average Daily Spending
     pdf.set_font('helvetica', 'B', 13)                                                  # Average Daily Spending
     pdf.set_xy(20, 210)                                                                 # Average Daily Spending
     pdf.cell(40, 10, 'Average Daily Cashflow:', border=0, align='L')                    # Average Daily Spending
     pdf.set_font('helvetica', '', 13)                                                        # Average Daily Spending
     pdf.set_xy(70, 210)                                                                      # Average Daily Spending
-    pdf.cell(120, 10, str(daily_income-daily_spending) + " " + currency, border=0, align='C')              # Average Daily Spending
+    pdf.cell(120, 10, format_cents(round(daily_income * 100) - round(daily_spending * 100)) + " " + currency, border=0, align='C')              # Average Daily Spending
     pdf.set_font('helvetica', 'B', 13)                                                  # Most Expensive Day and Amount
     pdf.set_xy(20, 230)                                                                 # Most Expensive Day and Amount
     pdf.cell(40, 10, 'Most Expensive Day & Amount:', border=0, align='L')                    # Most Expensive Day and Amount
@@ -190,121 +211,153 @@ def add_overview_page(pdf, w, oldest_date_str, newest_date_str, account_name, ba
     pdf.cell(120, 10, formatted_time_date, border=0, align='C')                        # Time and Date
     
 # 3 Page
-def add_budgetgraph_page(pdf, w):
+def add_budgetgraph_page(pdf, w, graph="budgetgraph.jpg"):
     pdf.add_page()
     pdf.set_xy(((w/2)-35), 13)
     pdf.set_font('helvetica', 'B', 16)
     pdf.cell(75, 15, 'Budget Graph', border=0, align='C')
-    pdf.image("budgetgraph.jpg", w=178, x=15, y=90)
+    pdf.image(graph, w=178, x=15, y=90)
+
+# Chart Pages
+def add_chart_page(pdf, w, title, image):
+    pdf.add_page()
+    pdf.set_xy(((w/2)-35), 13)
+    pdf.set_font('helvetica', 'B', 16)
+    pdf.cell(75, 15, title, border=0, align='C')
+    pdf.image(image, w=178, x=15, y=60)
     
-# Other Pages
-def add_other_pages(pdf, w):
-    with open("categorized_data.json", "r") as file:
-        data = json.load(file)
+# Breakdown layout: every row is 10mm high; a row that would start below 260mm goes to a new page at 20mm
+ROW_HEIGHT = 10
+PAGE_TOP = 20
+PAGE_BOTTOM = 260
+
+# Font of each kind of breakdown row
+ROW_FONTS = {
+    "category": ('B', 14),
+    "subcategory": ('B', 11),
+    "note": ('I', 10),
+    "transaction": ('', 10),
+}
 
+# Columns of a transaction row: (x, width, align)
+DATE_COLUMN = (20, 30, 'C')
+DESCRIPTION_COLUMN = (50, 100, 'L')
+AMOUNT_COLUMN = (150, 40, 'R')
+
+# Precompute the breakdown section as (kind, text) rows in print order
+def breakdown_layout(data):
     categories = ["Income", "Expenses", "Transfers", "Withdrawals"]
     uncategorized = data.get("Uncategorized", [])  # Get uncategorized transactions
-    pdf.add_page()
-    pdf.set_xy(((w / 2) - (70 / 2)), 13)
-    pdf.set_font('helvetica', 'B', 16)
-    pdf.cell(70, 15, 'Budget Breakdown', border=0, align='C')
+    omitted = data.get("Omitted", {})  # Older rows dropped by the streaming mode
 
-    y_position = 30  # Start position for the table content
-    page_number = 4  # Starting page number for this section
+    # Format every distinct date once instead of parsing each row
+    rows = [transaction for category in categories if category in data
+            for transactions in data[category].values() for transaction in transactions]
+    date_lookup = format_dates(transaction["Date"] for transaction in rows + uncategorized)
 
-    # Helper function to format dates
-    def format_date(date_str):
-        try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-            return date_obj.strftime("%d, %b, %Y")
-        except ValueError:
-            return "Invalid Date"
+    def transaction_rows(transactions):
+        return [("transaction", (date_lookup[transaction["Date"]], transaction["Description"], format_money(transaction['Amount'])))
+                for transaction in transactions]
 
-    # Iterate over categories
+    layout = []
     for category in categories:
         if category in data:
-            # Category Header
-            if y_position > 260:
-                pdf.add_page()
-                y_position = 20
-                page_number += 1
-
-            pdf.set_xy(20, y_position)
-            pdf.set_font('helvetica', 'B', 14)
-            pdf.cell(170, 10, category, border=1, align='C')
-            y_position += 10
-
+            layout.append(("category", category))
             # Subcategories and their transactions
             for subcategory, transactions in data[category].items():
                 if transactions:  # Ensure the subcategory has transactions
-                    if y_position > 260:
-                        pdf.add_page()
-                        y_position = 20
-                        page_number += 1
+                    layout.append(("subcategory", subcategory))
+                    # Note the older transactions that were not kept
+                    dropped = omitted.get(category, {}).get(subcategory, 0)
+                    if dropped:
+                        layout.append(("note", f"{dropped:,} earlier transactions not shown"))
+                    layout.extend(transaction_rows(transactions))
 
-                    pdf.set_xy(20, y_position)
-                    pdf.set_font('helvetica', 'B', 11)
-                    pdf.cell(170, 10, subcategory, border=0, align='L')
-                    y_position += 10
+    # Add uncategorized transactions section
+    if uncategorized:
+        layout.append(("category", 'Uncategorized Transactions'))
+        dropped = omitted.get("Uncategorized", 0)
+        if dropped:
+            layout.append(("note", f"{dropped:,} earlier transactions not shown"))
+        layout.extend(transaction_rows(uncategorized))
+    return layout
 
-                    # Transactions within the subcategory
-                    for transaction in transactions:
-                        if y_position > 260:
-                            pdf.add_page()
-                            y_position = 20
-                            page_number += 1
+# Draw the breakdown rows, paginating automatically and switching fonts only between blocks
+def render_breakdown(pdf, layout, y_position):
+    font = None
+    widths = {}  # Character widths in the current font; dates and amounts reuse a handful of characters
 
-                        pdf.set_xy(20, y_position)
-                        pdf.set_font('helvetica', '', 10)
-                        formatted_date = format_date(transaction["Date"])
-                        pdf.cell(30, 10, formatted_date, border=0, align='C')
-                        pdf.cell(100, 10, transaction["Description"], border=0, align='L')
-                        pdf.cell(40, 10, f"{transaction['Amount']:,.2f}", border=0, align='R')
-                        y_position += 10
+    def text_x(column, text):
+        x, width, align = column
+        if align == 'L':
+            return x + pdf.c_margin
+        for char in text:
+            if char not in widths:
+                widths[char] = pdf.get_string_width(char)
+        text_width = sum(widths[char] for char in text)
+        if align == 'C':
+            return x + (width - text_width) / 2
+        return x + width - pdf.c_margin - text_width
 
-    # Add uncategorized transactions section
-    if uncategorized:
-        if y_position > 260:
+    for kind, text in layout:
+        if y_position > PAGE_BOTTOM:
             pdf.add_page()
-            y_position = 20
-            page_number += 1
+            y_position = PAGE_TOP
+        if ROW_FONTS[kind] != font:
+            font = ROW_FONTS[kind]
+            pdf.set_font('helvetica', *font)
+            widths.clear()
+
+        if kind == "transaction":
+            # Place the text where cell() would, without its per-call layout work
+            baseline = y_position + 0.5 * ROW_HEIGHT + 0.3 * pdf.font_size
+            for column, value in zip((DATE_COLUMN, DESCRIPTION_COLUMN, AMOUNT_COLUMN), text):
+                pdf.text(text_x(column, value), baseline, value)
+        else:
+            pdf.set_xy(20, y_position)
+            pdf.cell(170, ROW_HEIGHT, text, border=1 if kind == "category" else 0, align='C' if kind == "category" else 'L')
+        y_position += ROW_HEIGHT
+    return y_position
 
-        # Uncategorize Header
-        pdf.set_xy(20, y_position)
-        pdf.set_font('helvetica', 'B', 14)
-        pdf.cell(170, 10, 'Uncategorized Transactions', border=1, align='C')
-        y_position += 10
+# Other Pages
+def add_other_pages(pdf, w, data=None):
+    if data is None:
+        data = read_categorized_data()
 
-        # Adding uncategorized transactions to the table
-        for transaction in uncategorized:
-            if y_position > 260:
-                pdf.add_page()
-                y_position = 20
-                page_number += 1
+    pdf.add_page()
+    pdf.set_xy(((w / 2) - (70 / 2)), 13)
+    pdf.set_font('helvetica', 'B', 16)
+    pdf.cell(70, 15, 'Budget Breakdown', border=0, align='C')
 
-            pdf.set_xy(20, y_position)
-            pdf.set_font('helvetica', '', 10)
-            formatted_date = format_date(transaction["Date"])
-            pdf.cell(30, 10, formatted_date, border=0, align='C')
-            pdf.cell(100, 10, transaction["Description"], border=0, align='L')
-            pdf.cell(40, 10, f"{transaction['Amount']:,.2f}", border=0, align='R')
-            y_position += 10
+    render_breakdown(pdf, breakdown_layout(data), 30)  # Start position for the table content
 
 # Main script
-def create_pdf(output_file, csv_file):
-    oldest_date_str, newest_date_str = load_date_range(csv_file)
+def create_pdf(output_file, transactions, data=None, settings=None, graph="budgetgraph.jpg", charts=None, date_range=None):
+    # Get the current time and date
+    now = datetime.now()
+    formatted_time_date = now.strftime("%H:%M:%S,       %d, %b, %Y")  # Time and Date
+
+    if date_range is None:
+        oldest_date_str, newest_date_str = load_date_range(transactions)
+    else:
+        # A period report knows its first and last day from the monthly aggregates
+        oldest_date_str, newest_date_str = (date.strftime("%d-%b-%Y") for date in date_range)
     pdf = FPDF('P', 'mm', 'A4')
     w, h = 210, 297
-    account_name, bank_format, currency = load_settings()
-    total_income, total_expense, total_transactions, total_outcome, starting_balance, ending_balance, daily_spending, daily_income, expensive_date, expensive_amount, total_item_desc, total_item_amount = load_categorized_data()
+    account_name, bank_format, currency = load_settings(settings)
+    if isinstance(transactions, pd.DataFrame) and 'Bank' in transactions.columns:
+        # Show the banks detected in the input files
+        bank_format = ", ".join(sorted(transactions['Bank'].dropna().astype(str).unique())) or bank_format
+    if data is None:
+        data = read_categorized_data()  # Read once, for the overview and the breakdown
+    total_income, total_expense, total_transactions, total_outcome, starting_balance, ending_balance, daily_spending, daily_income, expensive_date, expensive_amount, total_item_desc, total_item_amount = load_categorized_data(data)
 
     add_cover_page(pdf, w)
     add_disclaimer_page(pdf, w)
-    add_overview_page(pdf, w, oldest_date_str, newest_date_str, account_name, bank_format, currency, total_transactions, total_income, total_expense, total_outcome, starting_balance, ending_balance, daily_spending, daily_income, expensive_date, expensive_amount, total_item_desc, total_item_amount)
-    add_budgetgraph_page(pdf, w)
-    add_other_pages(pdf, w)
+    add_overview_page(pdf, w, oldest_date_str, newest_date_str, account_name, bank_format, currency, total_transactions, total_income, total_expense, total_outcome, starting_balance, ending_balance, daily_spending, daily_income, expensive_date, expensive_amount, total_item_desc, total_item_amount, formatted_time_date)
+    add_budgetgraph_page(pdf, w, graph)
+    for title, image in charts or []:  # Report charts from charts.py
+        add_chart_page(pdf, w, title, image)
+    add_other_pages(pdf, w, data)
 
     pdf.output(output_file)
-
-# Generate the PDF
-create_pdf('Budget.pdf', 'universal_transactions.csv')
@@ -1,47 +1,214 @@
-import pandas as pd
+import hashlib
+import io
 import json
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-
-# Load the Universal DataFrame
-df = pd.read_csv('universal_transactions.csv')
-
-# Parse the Date column as datetime objects
-df['Date'] = pd.to_datetime(df['Date'], errors='coerce')  # Convert to datetime, set invalid dates as NaT
-df = df.dropna(subset=['Date'])  # Drop rows with invalid dates
-
-# Sort the data by Date to ensure proper plotting
-df = df.sort_values(by='Date')
-
-# Load Settings
-settings_file_path = "settings.json"
-with open(settings_file_path, "r") as settings_file:
-    settings = json.load(settings_file)
-currency = settings["Config"]["Currency"]
-graph_interval = int(settings["Config"]["Graph_Interval"])  # Get the interval for x-axis ticks
-
-# Plot the Balance vs Time
-plt.figure('Balance vs Time', figsize=(10, 6))
-plt.fill_between(df['Date'], df['Balance'], 0, linestyle='-', color='cornflowerblue')
-plt.plot(df['Date'], df['Balance'], linestyle='-', color='navy', label='Balance')
-
-# Format the x-axis dates to show dd/mm/yyyy
-plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%d-%b-%Y'))
-plt.gca().xaxis.set_major_locator(mdates.DayLocator(interval=graph_interval))  # Use the interval from settings
-
-# Rotate date labels for better visibility
-plt.gcf().autofmt_xdate()
-
-# Add labels, title, and grid
-plt.xlabel('Date', size=13)
-plt.ylabel('Balance in ' + currency, size=13, labelpad=20)  # Adjusted with label padding
-plt.title('Balance Over Time', size=15)
-plt.grid(True)
-plt.legend()
-plt.minorticks_on()
-plt.ylim(0, df['Balance'].max() * 1.1)
-plt.xlim(df['Date'].min(), df['Date'].max())
-
-# Save the plot as an image
-plt.savefig('budgetgraph.jpg', dpi=300, bbox_inches='tight')
-# plt.show()
+import os
+import numpy as np
+import pandas as pd
+from converter.money import from_cents, is_cents
+
+# Size and resolution of the rendered graph
+FIGURE_SIZE = (10, 6)
+DPI = 300
+
+# The plot is at most this many pixels wide; points beyond a few per pixel column can't be seen
+MAX_BUCKETS = FIGURE_SIZE[0] * DPI
+
+# Bump when the look of the graph changes, so cached images are rendered again
+GRAPH_VERSION = 1
+
+def prepare_series(df):
+    """
+    Reduce transactions to the balance series that is plotted.
+
+    Args:
+        df (pd.DataFrame): Universal transactions with Date and Balance columns.
+
+    Returns:
+        pd.DataFrame: Date, Balance in currency units and Account (when present), sorted by date.
+    """
+    columns = [column for column in ['Date', 'Balance', 'Account'] if column in df.columns]
+    df = df[columns]
+    # Parse the Date column as datetime objects if it came from a CSV
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df = df.assign(Date=pd.to_datetime(df['Date'], format='%Y-%m-%d', errors='coerce'))  # Invalid dates become NaT
+    if is_cents(df['Balance']):
+        df = df.assign(Balance=from_cents(df['Balance']))
+    df = df.dropna(subset=['Date'])  # Drop rows with invalid dates
+
+    # Sort the data by Date to ensure proper plotting
+    return df.sort_values(by='Date')
+
+def downsample(dates, balances, buckets=MAX_BUCKETS):
+    """
+    Pick the points of a balance series that stay visible at the graph's resolution.
+
+    The time range is cut into one bucket per pixel column and each bucket keeps its
+    first, last, lowest and highest point, so the drawn line and area look the same.
+
+    Args:
+        dates (np.ndarray): Sorted datetime64 values.
+        balances (np.ndarray): The balance at each date.
+        buckets (int): Number of buckets across the time range.
+
+    Returns:
+        np.ndarray: Sorted positions of the points to plot.
+    """
+    count = len(dates)
+    if count <= 4 * buckets:
+        return np.arange(count)
+    times = dates.astype('int64')
+    span = times[-1] - times[0]
+    if span:
+        bucket = ((times - times[0]) / span * (buckets - 1)).astype(np.int64)
+    else:
+        bucket = np.zeros(count, dtype=np.int64)
+
+    # Buckets are contiguous because the dates are sorted
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], count] - 1
+    # Ordered by bucket, then balance: every bucket's lowest point comes first and its highest last
+    order = np.lexsort((balances, bucket))
+    return np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+
+def graph_key(series, currency, graph_interval):
+    """
+    Hash the plotted series and the graph settings.
+
+    Args:
+        series (pd.DataFrame): The output of prepare_series.
+        currency (str): The currency shown on the y-axis label.
+        graph_interval (int): Days between x-axis ticks.
+
+    Returns:
+        str: Hex sha256 naming the rendered image in the cache.
+    """
+    digest = hashlib.sha256(json.dumps([GRAPH_VERSION, currency, graph_interval]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def new_figure():
+    """
+    Create a figure on matplotlib's Agg canvas, without pyplot's global state.
+
+    Returns:
+        matplotlib.figure.Figure: An empty figure of FIGURE_SIZE.
+    """
+    # matplotlib is only imported when a graph is actually drawn
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=FIGURE_SIZE)
+    FigureCanvasAgg(fig)
+    return fig
+
+def figure_jpeg(fig):
+    # Render a figure as a JPEG in memory
+    image = io.BytesIO()
+    fig.savefig(image, format='jpg', dpi=DPI, bbox_inches='tight')
+    return image.getvalue()
+
+def render_graph(series, currency, graph_interval):
+    """
+    Plot the balance series with matplotlib's object-oriented Agg API.
+
+    Args:
+        series (pd.DataFrame): The output of prepare_series.
+        currency (str): The currency shown on the y-axis label.
+        graph_interval (int): Days between x-axis ticks.
+
+    Returns:
+        bytes: The rendered JPEG.
+    """
+    import matplotlib.dates as mdates
+
+    fig = new_figure()
+    ax = fig.add_subplot()
+
+    # Plot the Balance vs Time
+    accounts = series['Account'].unique() if 'Account' in series.columns else []
+    if len(accounts) > 1:
+        # One line per account; their balances don't stack into one series
+        for account in accounts:
+            account_df = series[series['Account'] == account]
+            dates, balances = account_df['Date'].to_numpy(), account_df['Balance'].to_numpy()
+            keep = downsample(dates, balances)
+            ax.plot(dates[keep], balances[keep], linestyle='-', label=str(account))
+    else:
+        dates, balances = series['Date'].to_numpy(), series['Balance'].to_numpy()
+        keep = downsample(dates, balances)
+        ax.fill_between(dates[keep], balances[keep], 0, linestyle='-', color='cornflowerblue')
+        ax.plot(dates[keep], balances[keep], linestyle='-', color='navy', label='Balance')
+
+    # Format the x-axis dates to show dd/mm/yyyy
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%b-%Y'))
+    ax.xaxis.set_major_locator(mdates.DayLocator(interval=graph_interval))  # Use the interval from settings
+
+    # Rotate date labels for better visibility
+    fig.autofmt_xdate()
+
+    # Add labels, title, and grid
+    ax.set_xlabel('Date', size=13)
+    ax.set_ylabel('Balance in ' + currency, size=13, labelpad=20)  # Adjusted with label padding
+    ax.set_title('Balance Over Time', size=15)
+    ax.grid(True)
+    ax.legend()
+    ax.minorticks_on()
+    ax.set_ylim(0, series['Balance'].max() * 1.1)
+    ax.set_xlim(series['Date'].min(), series['Date'].max())
+
+    # Render the plot as an image in memory
+    return figure_jpeg(fig)
+
+def create_graph(df, currency, graph_interval, output_file=None, cache_dir=None):
+    """
+    Plot the account balance over time.
+
+    Args:
+        df (pd.DataFrame): Universal transactions with Date and Balance columns.
+        currency (str): The currency shown on the y-axis label.
+        graph_interval (int): Days between x-axis ticks.
+        output_file (str, optional): Also save the JPEG to this path.
+        cache_dir (str, optional): Keep the last rendered graph here and reuse it while the
+            balances and settings are unchanged.
+
+    Returns:
+        io.BytesIO: The rendered JPEG, ready for the PDF.
+    """
+    series = prepare_series(df)
+
+    image = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, graph_key(series, currency, graph_interval) + ".jpg")
+        if os.path.exists(cache_file):
+            with open(cache_file, 'rb') as f:
+                image = f.read()
+            print("Balance graph unchanged, reusing the cached image.")
+    if image is None:
+        image = render_graph(series, currency, graph_interval)
+        if cache_dir:
+            # Only the latest graph is worth keeping
+            os.makedirs(cache_dir, exist_ok=True)
+            for old_file in os.listdir(cache_dir):
+                if old_file.endswith(".jpg"):
+                    os.remove(os.path.join(cache_dir, old_file))
+            with open(cache_file, 'wb') as f:
+                f.write(image)
+
+    # Save the plot to disk only when asked to
+    if output_file:
+        with open(output_file, 'wb') as f:
+            f.write(image)
+    return io.BytesIO(image)
+
+if __name__ == "__main__":
+    # Load the Universal DataFrame
+    df = pd.read_csv('universal_transactions.csv')
+
+    # Load Settings
+    settings_file_path = "settings.json"
+    with open(settings_file_path, "r") as settings_file:
+        settings = json.load(settings_file)
+    currency = settings["Config"]["Currency"]
+    graph_interval = int(settings["Config"]["Graph_Interval"])  # Get the interval for x-axis ticks
+
+    create_graph(df, currency, graph_interval, 'budgetgraph.jpg', settings["Config"].get("Graph_Cache") or None)
@@ -5,23 +5,42 @@
 # Project started on 19-Nov-2024
 __version__ = "0.2.0"
 
-import os
+import argparse
+from pipeline import PROFILE_STAGES, STAGES, Pipeline, load_settings
 
-# Get the directory of the current script
-current_dir = os.path.dirname(os.path.abspath(__file__))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turn bank statement CSVs into a PDF budget report.")
+    parser.add_argument("command", nargs="?", default="report", choices=STAGES,
+                        help="Stop after this stage (default: report). ingest, categorize and graph write "
+                             "universal_transactions.csv, the categorized data and budgetgraph.jpg")
+    parser.add_argument("--export", action="store_true",
+                        help="Also write universal_transactions.csv, the categorized data and budgetgraph.jpg")
+    parser.add_argument("--force", action="store_true", help="Rebuild the report even if nothing changed")
+    parser.add_argument("--profile", nargs="?", const="all", choices=PROFILE_STAGES,
+                        help="Run a stage (default: all) under cProfile and tracemalloc and write the dumps next to the report")
+    parser.add_argument("--period", nargs="+", metavar="PERIOD",
+                        help="Also write a report per period: a month (2024-10), quarter (2024-Q4), year (2024), "
+                             "YTD or a range of months (2024-01:2024-06)")
+    parser.add_argument("--suggest", action="store_true",
+                        help="Write filter_suggestions.json with keywords for the uncategorized transactions")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Run one report per job of a batch JSON file, each in its own output directory")
+    parser.add_argument("--workers", type=int, help="Batch jobs run at once (overrides the batch file)")
+    args = parser.parse_args()
+    if args.suggest and args.command not in ("categorize", "report"):
+        parser.error("--suggest only works with the categorize and report commands, which build the categorized data")
 
-# Define the relative paths to the target scripts
-converter = os.path.join(current_dir, "converter", "transaction_processor.py")
-extractor = os.path.join(current_dir, "processor", "extractor.py")
-grapher = os.path.join(current_dir, "grapher.py")
-pdfer = os.path.join(current_dir, "crafter", "pdfer.py")
-
-# Execute the target scripts
-with open(converter, 'r') as f:
-    exec(f.read())
-with open(extractor, 'r') as f:
-    exec(f.read())
-with open(grapher, 'r') as f:
-    exec(f.read()) 
-with open(pdfer, 'r') as f:
-    exec(f.read())
+    settings = load_settings("settings.json")
+    # Stopping early is only useful if the stage leaves its result on disk
+    export = args.export or args.command != "report"
+    try:
+        if args.batch:
+            # Many accounts, one process per job
+            from batch import load_batch, run_batch
+            run_batch(settings, load_batch(args.batch), export=export, workers=args.workers, force=args.force)
+        else:
+            # Run the stages in one process, passing the data in memory
+            Pipeline(settings, export=export, profile=args.profile, periods=args.period,
+                     suggest=args.suggest).run(args.command, force=args.force)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # Unix only; peak memory is left out elsewhere
+except ImportError:
+    resource = None
+
+# Prometheus metric per stage field: (field, metric name, help text)
+PROMETHEUS_METRICS = [
+    ("Wall Seconds", "miabudget_stage_wall_seconds", "Wall-clock time of a pipeline stage."),
+    ("CPU Seconds", "miabudget_stage_cpu_seconds", "CPU time of a pipeline stage."),
+    ("Peak RSS Bytes", "miabudget_stage_peak_rss_bytes", "Process peak resident memory at the end of a stage."),
+    ("Traced Peak Bytes", "miabudget_stage_traced_peak_bytes", "Peak memory allocated during a profiled stage."),
+    ("Rows", "miabudget_stage_rows", "Rows handled by a pipeline stage."),
+]
+
+def peak_rss():
+    # Process high-water mark of resident memory in bytes, or None where unknown
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024  # Linux reports KiB
+
+class StageTimer:
+    def __init__(self, output_dir=".", profile=None):
+        """
+        Collect timing, memory and row counts per pipeline stage.
+
+        Args:
+            output_dir (str): Where profile dumps and metric files are written.
+            profile (str, optional): Stage to run under cProfile and tracemalloc, or "all".
+        """
+        self.output_dir = output_dir
+        self.profile = profile
+        self.stages = {}  # Stage name -> metrics, in run order
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure one stage. The yielded dict can take extra fields, like "Rows".
+
+        Args:
+            name (str): The stage name.
+
+        Yields:
+            dict: The stage's metrics, filled in when the stage ends.
+        """
+        metrics = {}
+        profiler = self.start_profile(name) if self.profile in (name, "all") else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield metrics
+        except BaseException:
+            metrics["Failed"] = True
+            raise
+        finally:
+            metrics["Wall Seconds"] = round(time.perf_counter() - wall, 6)
+            metrics["CPU Seconds"] = round(time.process_time() - cpu, 6)
+            metrics["Peak RSS Bytes"] = peak_rss()
+            if profiler:
+                self.stop_profile(name, profiler, metrics)
+            self.stages[name] = metrics
+
+    def start_profile(self, name):
+        import cProfile
+        import tracemalloc
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profile(self, name, profiler, metrics):
+        # Dump the call profile (open with pstats or snakeviz) and the top allocations
+        import tracemalloc
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        metrics["Traced Peak Bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        profiler.dump_stats(os.path.join(self.output_dir, f"profile_{name}.prof"))
+        with open(os.path.join(self.output_dir, f"profile_{name}_memory.txt"), 'w') as f:
+            for statistic in snapshot.statistics('lineno')[:25]:
+                f.write(f"{statistic}\n")
+
+    def summary(self):
+        # One line per stage
+        lines = [f"{'Stage':<12} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak MB':>9} {'Rows':>10} {'Cache':>6}"]
+        for name, metrics in self.stages.items():
+            peak = metrics.get("Peak RSS Bytes")
+            lines.append(f"{name:<12} {metrics['Wall Seconds']:>9.3f} {metrics['CPU Seconds']:>9.3f} "
+                         f"{(peak or 0) / 2**20:>9.1f} {metrics.get('Rows', ''):>10} {'hit' if metrics.get('Cached') else '':>6}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: One gauge per field, labelled by stage.
+        """
+        lines = []
+        for field, metric, help_text in PROMETHEUS_METRICS:
+            samples = [(name, metrics[field]) for name, metrics in self.stages.items() if metrics.get(field) is not None]
+            if not samples:
+                continue
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            lines += [f'{metric}{{stage="{name}"}} {value}' for name, value in samples]
+        return "\n".join(lines) + "\n"
+
+    def write(self, metrics_format):
+        """
+        Save the metrics next to the report.
+
+        Args:
+            metrics_format (str): "json", "prometheus", or "" to write nothing.
+
+        Returns:
+            str: The written file, or None.
+        """
+        if not metrics_format:
+            return None
+        if metrics_format == "json":
+            output_file = os.path.join(self.output_dir, "pipeline_metrics.json")
+            with open(output_file, 'w') as f:
+                json.dump({"Stages": self.stages}, f, indent=4)
+        elif metrics_format == "prometheus":
+            output_file = os.path.join(self.output_dir, "pipeline_metrics.prom")
+            with open(output_file, 'w') as f:
+                f.write(self.prometheus())
+        else:
+            raise ValueError(f"Unknown Metrics format '{metrics_format}', use 'json', 'prometheus' or ''.")
+        return output_file
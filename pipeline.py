@@ -0,0 +1,476 @@
+import glob
+import hashlib
+import io
+import json
+import os
+from metrics import StageTimer
+from stage_cache import StageCache, cache_key, file_digest
+
+# Every stage imports pandas, matplotlib or fpdf itself, so a run with nothing to do starts fast
+
+# Stages a run can stop after, in order
+STAGES = ["ingest", "categorize", "graph", "report"]
+
+# Timed stages that --profile can pick; streaming runs ingest and categorize as one "stream" stage
+PROFILE_STAGES = ["all", "ingest", "stream", "categorize", "suggest", "graph", "charts", "report", "periods"]
+
+# Written next to the report after a successful run, to skip the next one if nothing changed
+STATE_FILE = ".miabudget_state.json"
+
+def load_settings(settings_file="settings.json"):
+    # Load settings.json
+    with open(settings_file, "r") as f:
+        return json.load(f)
+
+class Pipeline:
+    def __init__(self, settings, input_folder="input", mapping_file="banks.json", filter_file="filter.json",
+                 output_dir=".", export=False, profile=None, periods=None, suggest=False):
+        """
+        Run every stage of MiaBudget in one process, passing the data in memory.
+
+        Args:
+            settings (dict): The parsed settings.json.
+            input_folder (str): The folder containing the bank CSV files.
+            mapping_file (str): The JSON file containing the header mappings.
+            filter_file (str): The filter.json with the categories.
+            output_dir (str): Where Budget.pdf (and any exported files) are written.
+            export (bool): Also write universal_transactions.csv, categorized_data.json (or
+                .npz, see Categorized_Format) and budgetgraph.jpg, like the old scripts did.
+            profile (str, optional): Stage to run under cProfile and tracemalloc, or "all";
+                the dumps are written next to the report.
+            periods (list of str, optional): Extra reports for these periods, e.g. "2024-10",
+                "2024-Q4", "YTD" (see processor/periods.py), written as Budget_<period>.pdf.
+            suggest (bool): Write filter_suggestions.json with filter.json keywords for the
+                uncategorized transactions (see processor/suggest.py).
+        """
+        self.settings = settings
+        self.config = settings.get("Config", {})
+        self.input_folder = input_folder
+        self.mapping_file = mapping_file
+        self.filter_file = filter_file
+        self.output_dir = output_dir
+        self.export = export
+        self.periods = periods or []
+        self.suggest = suggest
+        self.timer = StageTimer(output_dir, profile)
+        self.cache = StageCache(self.config.get("Stage_Cache") or None)
+        self.keys = {}  # Cache key of every stage that ran, for the stages after it
+        self.compiled = None  # (filter.json digest, KeywordMatcher), reused while filter.json is unchanged
+
+        # Results handed from one stage to the next
+        self.transactions = None
+        self.categorized_data = None
+        self.graph = None
+        self.chart_data = None
+        self.chart_totals = None
+        self.aggregates = None
+        self.charts = None
+
+    def output_path(self, file_name):
+        return os.path.join(self.output_dir, file_name)
+
+    def write_output(self, file_name, data):
+        with open(self.output_path(file_name), 'wb') as f:
+            f.write(data)
+
+    def input_files(self):
+        # (path, size, mtime) of every input CSV; a changed statement changes its size or mtime
+        return [(file, os.stat(file).st_size, os.stat(file).st_mtime_ns)
+                for file in sorted(glob.glob(f"{self.input_folder}/*.csv"))]
+
+    def ingest_key(self, stage="ingest"):
+        # Cache key of the universal transactions and their quarantine: the input files, banks.json
+        # and the converter config
+        return cache_key(stage, self.input_files(), file_digest(self.mapping_file),
+                         self.config.get("Bank", "default"), self.config.get("Money", "float"),
+                         self.config.get("Quarantine_File", ""))
+
+    def quarantine_file(self):
+        # Where rejected rows are written, or None when they are only counted
+        return self.output_path(self.config["Quarantine_File"]) if self.config.get("Quarantine_File") else None
+
+    def processor(self):
+        from converter.transaction_processor import TransactionProcessor
+        return TransactionProcessor(
+            input_folder=self.input_folder,
+            output_file=self.output_path("universal_transactions.csv") if self.export else None,
+            mapping_file=self.mapping_file,
+            bank=self.config.get("Bank", "default"),
+            store_file=self.config.get("Transaction_Store") or None,
+            workers=int(self.config.get("Load_Workers", "1")),
+            executor=self.config.get("Load_Executor", "process"),
+            engine=self.config.get("CSV_Engine", "c"),
+            cents=self.config.get("Money", "float") == "cents",
+            quarantine_file=self.quarantine_file()
+        )
+
+    def matcher(self):
+        # One compiled filter.json, shared by the extractor and the charts, and by later runs of a long-lived pipeline
+        from processor.matcher import KeywordMatcher
+        digest = file_digest(self.filter_file)
+        if self.compiled is None or self.compiled[0] != digest:
+            with open(self.filter_file, 'r') as f:
+                filters = json.load(f)
+            self.compiled = (digest, KeywordMatcher(filters, self.config.get("Category_Cache") or None))
+        return self.compiled[1]
+
+    def chart_accumulator(self, matcher):
+        from charts import ChartAccumulator
+        return ChartAccumulator(matcher, int(self.config.get("Top_Merchants", "10")))
+
+    def monthly_aggregates(self, matcher):
+        from processor.periods import MonthlyAggregates
+        return MonthlyAggregates(matcher)
+
+    def ingest(self):
+        """
+        Load, clean and combine the bank CSV files, or reuse them when the inputs are unchanged.
+
+        A reused result still rewrites the quarantine file and prints the rejected counts,
+        so they never depend on whether the stage cache was hit.
+
+        Returns:
+            pd.DataFrame: The universal transactions.
+        """
+        key = self.keys["ingest"] = self.ingest_key()
+        cached = self.cache.load("ingest", key, size=3)
+        if cached is None:
+            processor = self.processor()
+            self.transactions = processor.process_transactions()
+            self.cache.save("ingest", key, (self.transactions, processor.skipped, processor.rejected))
+            return self.transactions
+
+        from converter.validation import report_quarantine
+        self.transactions, skipped, rejected = cached
+        report_quarantine(self.quarantine_file(), skipped, rejected)
+        if self.export:
+            from converter.money import amounts_to_currency
+            output_file = self.output_path("universal_transactions.csv")
+            amounts_to_currency(self.transactions).to_csv(output_file, index=False)
+            print(f"Universal transactions saved successfully to {output_file}.")
+        return self.transactions
+
+    def categorize(self):
+        """
+        Categorize the transactions with filter.json and compute the statistics and chart data.
+
+        Returns:
+            dict: The categorized data.
+        """
+        key = self.keys["categorize"] = cache_key("categorize", self.keys["ingest"], file_digest(self.filter_file),
+                                                  self.config.get("Top_Merchants", "10"))
+        cached = self.cache.load("categorize", key, size=4)
+        if cached is None:
+            from processor.extractor import extract_data
+            matcher = self.matcher()
+            self.aggregates = self.monthly_aggregates(matcher)
+            self.categorized_data = extract_data(self.transactions, self.filter_file, matcher=matcher,
+                                                 aggregates=self.aggregates)
+            charts = self.chart_accumulator(matcher)
+            charts.update(self.transactions)
+            self.chart_data, self.chart_totals = charts.result(), charts.totals()
+            self.cache.save("categorize", key, (self.categorized_data, self.chart_data, self.chart_totals, self.aggregates))
+        else:
+            self.categorized_data, self.chart_data, self.chart_totals, self.aggregates = cached
+        self.write_categorized_data()
+        return self.categorized_data
+
+    def write_categorized_data(self):
+        if self.export:
+            categorized_format = self.config.get("Categorized_Format", "json")
+            if categorized_format == "npz":
+                # Dictionary-encoded columns and a statistics sidecar (see processor/columnar.py)
+                from processor.columnar import write_columnar
+                output_file = self.output_path("categorized_data.npz")
+                write_columnar(output_file, self.categorized_data)
+            elif categorized_format == "json":
+                output_file = self.output_path("categorized_data.json")
+                with open(output_file, 'w') as f:
+                    json.dump(self.categorized_data, f, indent=4)
+            else:
+                raise ValueError(f"Unknown Categorized_Format '{categorized_format}', use 'json' or 'npz'.")
+            print(f"Categorized data saved to: {output_file}")
+
+    def stream(self, chunksize):
+        """
+        Ingest and categorize chunk by chunk, for exports too large to hold in memory.
+
+        Only the statistics, the breakdown rows (capped by Breakdown_Limit), the monthly chart
+        aggregates and one balance per day for the graph are kept; the full transaction table never is.
+
+        Args:
+            chunksize (int): Rows per chunk.
+
+        Returns:
+            dict: The categorized data.
+        """
+        self.keys["ingest"] = self.ingest_key("stream")
+        key = self.keys["categorize"] = cache_key("stream", self.keys["ingest"], file_digest(self.filter_file),
+                                                  self.config.get("Top_Merchants", "10"),
+                                                  self.config.get("Breakdown_Limit", "0"))
+        # The export needs every row, which only a real pass has
+        cached = None if self.export else self.cache.load("stream", key, size=7)
+        if cached is not None:
+            from converter.validation import report_quarantine
+            self.categorized_data, self.chart_data, self.chart_totals, self.aggregates, self.transactions, skipped, rejected = cached
+            report_quarantine(self.quarantine_file(), skipped, rejected)
+            return self.categorized_data
+
+        import pandas as pd
+        from converter.money import amounts_to_currency
+        from processor.extractor import extract_stream
+        daily_balances = []
+        matcher = self.matcher()
+        charts = self.chart_accumulator(matcher)
+        self.aggregates = self.monthly_aggregates(matcher)
+        export_file = self.output_path("universal_transactions.csv") if self.export else None
+
+        def tap(batches):
+            for index, batch in enumerate(batches):
+                if export_file:
+                    amounts_to_currency(batch).to_csv(export_file, mode='w' if index == 0 else 'a', header=index == 0, index=False)
+                # Closing balance of every account and day is all the graph and date range need
+                daily_balances.append(batch.dropna(subset=['Date']).groupby(['Account', 'Date'], sort=False, observed=True)[['Balance', 'Bank']].last())
+                charts.update(batch)
+                yield batch
+
+        processor = self.processor()
+        batches = processor.stream_transactions(chunksize)
+        limit = int(self.config.get("Breakdown_Limit", "0"))
+        self.categorized_data = extract_stream(tap(batches), self.filter_file, limit, matcher=matcher,
+                                               aggregates=self.aggregates)
+        self.chart_data, self.chart_totals = charts.result(), charts.totals()
+        if export_file:
+            print(f"Universal transactions saved successfully to {export_file}.")
+
+        # A day can span two chunks; keep its last balance
+        if daily_balances:
+            balances = pd.concat(daily_balances).groupby(level=[0, 1], sort=False, observed=True).last()
+            self.transactions = balances.reset_index().sort_values(by='Date', kind='stable')
+        else:
+            self.transactions = pd.DataFrame(columns=['Account', 'Date', 'Balance', 'Bank'])
+        self.cache.save("stream", key, (self.categorized_data, self.chart_data, self.chart_totals,
+                                        self.aggregates, self.transactions, processor.skipped, processor.rejected))
+        self.write_categorized_data()
+        return self.categorized_data
+
+    def graph_balance(self):
+        """
+        Render the balance graph.
+
+        Not kept in the Stage_Cache: the Graph_Cache already reuses the image while the
+        plotted balances are unchanged.
+
+        Returns:
+            io.BytesIO: The rendered JPEG.
+        """
+        from grapher import create_graph
+        self.graph = create_graph(
+            self.transactions,
+            self.config["Currency"],
+            int(self.config["Graph_Interval"]),
+            self.output_path("budgetgraph.jpg") if self.export else None,
+            self.config.get("Graph_Cache") or None
+        )
+        return self.graph
+
+    def chart_spending(self):
+        """
+        Render the spending and cashflow charts.
+
+        Returns:
+            list of tuple: (page title, io.BytesIO JPEG) per chart.
+        """
+        from charts import CHARTS, create_charts
+        key = self.keys["charts"] = cache_key("charts", self.keys["categorize"], self.config["Currency"])
+        cached = self.cache.load("charts", key)
+        if cached is None:
+            self.charts = create_charts(self.chart_data, self.config["Currency"], self.output_dir if self.export else None)
+            self.cache.save("charts", key, [(title, image.getvalue()) for title, image in self.charts])
+        else:
+            self.charts = [(title, io.BytesIO(image)) for title, image in cached]
+            if self.export:
+                file_names = {title: file_name for title, _, _, file_name in CHARTS}
+                for title, image in cached:
+                    self.write_output(file_names[title], image)
+        return self.charts
+
+    def report(self):
+        """
+        Build the PDF report from the results of the earlier stages.
+
+        The PDF is always rebuilt, never taken from the Stage_Cache, since it shows the
+        time it was made.
+
+        Returns:
+            str: The path of the written PDF.
+        """
+        from crafter.pdfer import create_pdf
+        output_file = self.output_path("Budget.pdf")
+        create_pdf(output_file, self.transactions, self.categorized_data, self.settings, self.graph, self.charts)
+        print(f"Budget report saved to {output_file}.")
+        return output_file
+
+    def suggest_filters(self):
+        """
+        Propose filter.json keywords for the uncategorized transactions.
+
+        Returns:
+            dict: The suggestions, also written to filter_suggestions.json.
+        """
+        from processor.suggest import write_suggestions
+        output_file = self.output_path("filter_suggestions.json")
+        suggestions = write_suggestions(output_file, self.categorized_data)
+        print(f"{len(suggestions['Suggestions'])} filter suggestions saved to {output_file}.")
+        return suggestions
+
+    def period_reports(self):
+        """
+        Build one report per requested period from the monthly aggregates.
+
+        Statistics and charts combine the months of the period; the graph and the breakdown
+        take the period's slice of the date-ordered transactions and categorized rows.
+
+        Returns:
+            list of str: The paths of the written PDFs.
+        """
+        import numpy as np
+        from charts import chart_tables, create_charts
+        from crafter.pdfer import create_pdf
+        from grapher import create_graph
+        from processor.extractor import extract_period
+        from processor.periods import parse_period
+        output_files = []
+        dates = self.transactions['Date'].to_numpy()
+        for name in self.periods:
+            start, end = parse_period(name, self.aggregates.last_month())
+            date_range = self.aggregates.date_range(start, end)
+            if date_range[0] is None:
+                print(f"No transactions in period {name}, skipped.")
+                continue
+            # Date order, so the period's rows are one slice
+            first = np.datetime64(start.start_time)
+            after = np.datetime64((end + 1).start_time)
+            transactions = self.transactions.iloc[np.searchsorted(dates, first):np.searchsorted(dates, after)]
+
+            data = extract_period(self.categorized_data, self.aggregates, start, end)
+            graph = create_graph(transactions, self.config["Currency"], int(self.config["Graph_Interval"]))
+            chart_data = chart_tables(self.chart_totals, int(self.config.get("Top_Merchants", "10")), start, end)
+            charts = create_charts(chart_data, self.config["Currency"])
+            output_file = self.output_path(f"Budget_{name.strip().replace(':', '_to_')}.pdf")
+            create_pdf(output_file, transactions, data, self.settings, graph, charts, date_range)
+            print(f"Budget report for {name} saved to {output_file}.")
+            output_files.append(output_file)
+        return output_files
+
+    def fingerprint(self):
+        """
+        Summarize everything the report depends on: the input files' size and modification
+        time, filter.json, banks.json and the settings.
+
+        Returns:
+            str: Hex sha256 of the inputs.
+        """
+        digest = hashlib.sha256()
+        for file, size, mtime in self.input_files():
+            digest.update(f"{file}|{size}|{mtime}\n".encode("utf-8"))
+        for file in [self.filter_file, self.mapping_file]:
+            with open(file, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        digest.update(json.dumps([self.settings, self.export, self.periods, self.suggest], sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def up_to_date(self, fingerprint):
+        # True if the report exists and was built from the same inputs
+        state_file = self.output_path(STATE_FILE)
+        if not (os.path.exists(state_file) and os.path.exists(self.output_path("Budget.pdf"))):
+            return False
+        try:
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return state.get("Fingerprint") == fingerprint
+
+    def save_state(self, fingerprint):
+        with open(self.output_path(STATE_FILE), 'w') as f:
+            json.dump({"Fingerprint": fingerprint}, f)
+
+    def run(self, until="report", force=False):
+        """
+        Run ingest -> categorize -> graph -> charts -> report (-> periods), or stop after an earlier stage.
+
+        A full run is skipped when nothing changed since the last report, and any stage whose
+        inputs and config are unchanged is served from the Stage_Cache.
+
+        Args:
+            until (str): The last stage to run, one of STAGES.
+            force (bool): Rebuild the report and every stage even if nothing changed.
+
+        Returns:
+            str: The path of the PDF, or None when stopping before the report.
+        """
+        if until not in STAGES:
+            raise ValueError(f"Unknown stage '{until}', use one of {', '.join(STAGES)}.")
+        # Taken before the run, so files changed meanwhile are picked up next time
+        fingerprint = self.fingerprint() if until == "report" else None
+        if until == "report" and not force and self.up_to_date(fingerprint):
+            print(f"Nothing changed since the last report, {self.output_path('Budget.pdf')} is up to date.")
+            return self.output_path("Budget.pdf")
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.cache.read = not force
+        metrics_format = self.config.get("Metrics", "json")
+        if metrics_format not in ("json", "prometheus", ""):
+            raise ValueError(f"Unknown Metrics format '{metrics_format}', use 'json', 'prometheus' or ''.")
+        try:
+            output_file = self.run_stages(until)
+        finally:
+            # Also written when a stage fails, to see how far it got
+            self.timer.write(metrics_format)
+        print(self.timer.summary())
+        if output_file:
+            self.save_state(fingerprint)
+        return output_file
+
+    def run_stages(self, until):
+        # Run the stages up to `until`, timing each; returns the PDF path when the report was built
+        chunksize = int(self.config.get("Stream_Chunksize", "0"))
+        if chunksize > 0:
+            with self.timer.stage("stream") as stage:
+                self.stream(chunksize)  # Ingests and categorizes in one pass
+                stage["Cached"] = "stream" in self.cache.hits
+                stage["Rows"] = self.categorized_data["Statistics"]["Total Transactions"]
+        else:
+            with self.timer.stage("ingest") as stage:
+                self.ingest()
+                stage["Cached"] = "ingest" in self.cache.hits
+                stage["Rows"] = len(self.transactions)
+            if until in ("categorize", "report"):
+                with self.timer.stage("categorize") as stage:
+                    self.categorize()
+                    stage["Cached"] = "categorize" in self.cache.hits
+                    stage["Rows"] = len(self.transactions)
+        # Suggestions need the categorized data, which only these runs build
+        if self.suggest and until in ("categorize", "report"):
+            with self.timer.stage("suggest") as stage:
+                stage["Rows"] = len(self.suggest_filters()["Suggestions"])
+        if until in ("graph", "report"):
+            with self.timer.stage("graph") as stage:
+                self.graph_balance()
+                stage["Rows"] = len(self.transactions)
+        if until != "report":
+            return None
+        with self.timer.stage("charts") as stage:
+            self.chart_spending()
+            stage["Cached"] = "charts" in self.cache.hits
+            stage["Rows"] = len(self.charts)
+        with self.timer.stage("report") as stage:
+            output_file = self.report()
+            stage["Rows"] = sum(len(rows) for category, subcategories in self.categorized_data.items()
+                                if category not in ("Statistics", "Omitted")
+                                for rows in (subcategories.values() if isinstance(subcategories, dict) else [subcategories]))
+        if self.periods:
+            with self.timer.stage("periods") as stage:
+                stage["Rows"] = len(self.period_reports())
+        return output_file
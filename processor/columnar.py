@@ -0,0 +1,130 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Columns of the export, one row per (transaction, subcategory it is listed under)
+COLUMNS = ["Category", "Subcategory", "Date", "Description", "Amount"]
+
+# Dictionary-encoded columns: the column holds integer codes into "<column>_Names"
+ENCODED = ["Category", "Subcategory", "Description"]
+
+# Category of the uncategorized rows, which are a list instead of subcategories
+UNCATEGORIZED = ("Uncategorized", "")
+
+def statistics_path(output_file):
+    # The JSON sidecar next to a columnar export, e.g. categorized_data_statistics.json
+    return os.path.splitext(output_file)[0] + "_statistics.json"
+
+def _encode(values):
+    # (codes, names) of a list of strings, names in first-seen order
+    codes, names = pd.factorize(pd.Series(values, dtype=object))
+    dtype = np.int16 if len(names) < 2**15 else np.int32
+    return codes.astype(dtype), np.asarray(names.tolist(), dtype=str)
+
+def write_columnar(output_file, data):
+    """
+    Write the categorized data as dictionary-encoded columns plus a small JSON sidecar.
+
+    The columns go into an uncompressed .npz, so a reader loads only the arrays it asks
+    for. The sidecar holds the statistics, the category layout (including empty
+    subcategories) and the "Omitted" counts, so the overview page needs no rows at all.
+
+    Args:
+        output_file (str): Path of the .npz file; the sidecar is written next to it.
+        data (dict): The categorized data.
+
+    Returns:
+        int: Rows written.
+    """
+    categories, subcategories, dates, descriptions, amounts = [], [], [], [], []
+    layout = {}
+    for main_category, subcategory_rows in data.items():
+        if main_category in ("Statistics", "Omitted"):
+            continue
+        if main_category == UNCATEGORIZED[0]:
+            layout[main_category] = None
+            groups = [(UNCATEGORIZED[1], subcategory_rows)]
+        else:
+            layout[main_category] = list(subcategory_rows)
+            groups = subcategory_rows.items()
+        for subcategory, rows in groups:
+            categories.extend([main_category] * len(rows))
+            subcategories.extend([subcategory] * len(rows))
+            for row in rows:
+                dates.append(row["Date"])
+                descriptions.append(row["Description"])
+                amounts.append(row["Amount"])
+
+    columns = {"Date": np.array(dates, dtype='datetime64[D]'), "Amount": np.array(amounts, dtype=np.float64)}
+    for column, values in zip(ENCODED, (categories, subcategories, descriptions)):
+        columns[column], columns[f"{column}_Names"] = _encode(values)
+    np.savez(output_file, **columns)
+
+    sidecar = {"Statistics": data.get("Statistics"), "Categories": layout, "Rows": len(amounts)}
+    if "Omitted" in data:
+        sidecar["Omitted"] = data["Omitted"]
+    with open(statistics_path(output_file), 'w') as f:
+        json.dump(sidecar, f, indent=4)
+    return len(amounts)
+
+def read_statistics(input_file):
+    """
+    Read the JSON sidecar of a columnar export, without touching the rows.
+
+    Returns:
+        dict: "Statistics", "Categories" ({category: [subcategories]} in the original order,
+        with None for "Uncategorized"), "Rows" and, in streaming mode, "Omitted".
+    """
+    with open(statistics_path(input_file), 'r') as f:
+        return json.load(f)
+
+def read_columns(input_file, columns=None, decode=True):
+    """
+    Load some columns of a columnar export.
+
+    Args:
+        input_file (str): The .npz file.
+        columns (list of str, optional): Names from COLUMNS; all of them if None.
+        decode (bool): Turn the encoded columns into strings. Without it they stay
+            integer codes and their "<column>_Names" arrays are returned as well.
+
+    Returns:
+        dict: Column name -> np.ndarray. Dates are datetime64[D] (NaT for unknown dates).
+    """
+    result = {}
+    with np.load(input_file, allow_pickle=False) as npz:
+        for column in columns or COLUMNS:
+            values = npz[column]
+            if column in ENCODED:
+                names = npz[f"{column}_Names"]
+                if decode:
+                    values = names[values]
+                else:
+                    result[f"{column}_Names"] = names
+            result[column] = values
+    return result
+
+def read_columnar(input_file):
+    """
+    Rebuild the categorized data from a columnar export.
+
+    Returns:
+        dict: The categorized data, keyed like categorized_data.json.
+    """
+    sidecar = read_statistics(input_file)
+    data = {"Statistics": sidecar["Statistics"]}
+    for main_category, subcategories in sidecar["Categories"].items():
+        data[main_category] = [] if subcategories is None else {subcategory: [] for subcategory in subcategories}
+
+    columns = read_columns(input_file)
+    dates = np.datetime_as_string(columns["Date"]).astype(object)
+    dates[np.isnat(columns["Date"])] = ""
+    for main_category, subcategory, date, description, amount in zip(
+            columns["Category"].tolist(), columns["Subcategory"].tolist(), dates.tolist(),
+            columns["Description"].tolist(), columns["Amount"].tolist()):
+        rows = data["Uncategorized"] if main_category == UNCATEGORIZED[0] else data[main_category][subcategory]
+        rows.append({"Date": date, "Description": description, "Amount": amount})
+    if "Omitted" in sidecar:
+        data["Omitted"] = sidecar["Omitted"]
+    return data
@@ -1,156 +1,345 @@
 from datetime import datetime
 import json
-import csv
-import os
-from collections import defaultdict
+import numpy as np
+import pandas as pd
+from converter.money import AMOUNT_COLUMNS, from_cents, is_cents
+from converter.schema import ISO_DATE_FORMAT, enforce_schema
+from processor.matcher import KeywordMatcher
+from processor.rules import RULES_KEY
 
-def extract_data(csv_file, json_file):
-    # Load filter.json
-    with open(json_file, 'r') as f:
-        filters = json.load(f)
-    
-    # Initialize data structure for categorized data
-    categorized_data = {
-        "Statistics": {
-            "Total Income": 0.0,
-            "Total Expenses": 0.0,
-            "Total Transactions": 0,
+def load_transactions(csv_file):
+    # Read the universal CSV into the typed schema
+    df = pd.read_csv(csv_file, dtype={"Description": str}, keep_default_na=False)
+    df["Date"] = pd.to_datetime(df["Date"], format=ISO_DATE_FORMAT, errors='coerce')
+    df[AMOUNT_COLUMNS] = df[AMOUNT_COLUMNS].astype('float64')  # The CSV is in currency units
+    return enforce_schema(df)
+
+def date_strings(dates):
+    # ISO strings for the categorized output; each distinct day is formatted once
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.fillna("").astype(str)
+    codes, uniques = pd.factorize(dates)
+    formatted = np.append(uniques.strftime(ISO_DATE_FORMAT).to_numpy(dtype=object), "")
+    return pd.Series(formatted[codes], index=dates.index)  # NaT has code -1, the trailing ""
+
+def description_strings(descriptions):
+    # Plain strings, with missing descriptions as "" (a categorical can't be filled in place)
+    return descriptions.astype(object).fillna("").astype(str)
+
+class StatisticsAccumulator:
+    def __init__(self):
+        """
+        Build the "Statistics" block from one or more chunks of universal transactions.
+
+        Each chunk is reduced with vectorized sums and groupbys; only running totals,
+        the first/last balance and per-day / per-item totals are kept between chunks.
+        Amounts held as int64 cents are summed exactly and turned back into currency
+        units only in the result.
+        """
+        self.cents = None  # Decided by the first chunk
+        self.total_income = 0
+        self.total_expenses = 0
+        self.total_transactions = 0
+        self.starting_balances = {}  # Per account, so several accounts add up
+        self.ending_balances = {}
+        self.unique_dates = set()
+        self.daily_expenses = {}  # Insertion order = first-seen order, so ties resolve like before
+        self.item_totals = {}
+
+    def _running_sum(self, total, values):
+        if not len(values):
+            return total
+        if self.cents:
+            return total + int(values.sum())  # Integer sums are exact in any order
+        # cumsum adds in row order, so the totals match the running sums of the CSV loop bit for bit
+        return float(np.cumsum(np.concatenate(([total], values)))[-1])
+
+    @staticmethod
+    def _add_totals(totals, values, keys):
+        grouped = pd.Series(values).groupby(keys, sort=False).sum()
+        for key, value in zip(grouped.index.tolist(), grouped.tolist()):
+            totals[key] = totals.get(key, 0) + value
+
+    def _money(self, amount, rounded=True):
+        # Currency units for the output: exact from cents, or rounded to 2 decimals from floats
+        if self.cents:
+            return from_cents(int(round(amount)))
+        return round(amount, 2) if rounded else float(amount)
+
+    def update(self, df):
+        """
+        Add a chunk of transactions, in date order, to the statistics.
+
+        Args:
+            df (pd.DataFrame): Universal transactions with Date, Description, Expense, Income and Balance columns.
+        """
+        if df.empty:
+            return
+        if self.cents is None:
+            self.cents = is_cents(df["Expense"])
+        dtype = np.int64 if self.cents else float
+        dates = date_strings(df["Date"]).to_numpy()
+        expense = df["Expense"].to_numpy(dtype=dtype)
+        income = df["Income"].to_numpy(dtype=dtype)
+        balance = df["Balance"].to_numpy(dtype=dtype)
+        spent = expense > 0
+
+        self.total_income = self._running_sum(self.total_income, income[income > 0])
+        self.total_expenses = self._running_sum(self.total_expenses, expense[spent])
+        self.total_transactions += len(df)
+
+        # Starting and ending balances of every account
+        if "Account" in df.columns:
+            balances = pd.Series(balance).groupby(df["Account"].to_numpy(), sort=False)
+            firsts, lasts = balances.first(), balances.last()
+            for account, value in zip(firsts.index.tolist(), firsts.tolist()):
+                self.starting_balances.setdefault(account, value)
+            self.ending_balances.update(zip(lasts.index.tolist(), lasts.tolist()))
+        else:
+            self.starting_balances.setdefault(None, balance[0].item())
+            self.ending_balances[None] = balance[-1].item()
+
+        self.unique_dates.update(pd.unique(dates).tolist())
+
+        if spent.any():
+            # Daily expenses and total spending for each item
+            descriptions = description_strings(df["Description"]).to_numpy()
+            self._add_totals(self.daily_expenses, expense[spent], dates[spent])
+            self._add_totals(self.item_totals, expense[spent], descriptions[spent])
+
+    def result(self):
+        """
+        Returns:
+            dict: The statistics, keyed exactly like categorized_data.json.
+        """
+        statistics = {
+            "Total Income": self._money(self.total_income, rounded=False),
+            "Total Expenses": self._money(self.total_expenses, rounded=False),
+            "Total Transactions": self.total_transactions,
             "Starting Balance": 0.0,
             "Ending Balance": 0.0,
             "Average Daily Spending": 0.0,
             "Average Daily Income": 0.0,
             "Most Expensive Day": {"Date": None, "Amount": 0.0},
             "Item with Highest Total Spending": {"Description": None, "Total Amount": 0.0}
-        },
+        }
+        if not self.total_transactions:
+            return statistics
+
+        statistics["Starting Balance"] = self._money(sum(self.starting_balances.values()))
+        statistics["Ending Balance"] = self._money(sum(self.ending_balances.values()))
+
+        # Average daily spending and income over every day with a transaction
+        num_days = len(self.unique_dates)
+        statistics["Average Daily Spending"] = self._money(self.total_expenses / num_days)
+        statistics["Average Daily Income"] = self._money(self.total_income / num_days)
+
+        # Most expensive day
+        if self.daily_expenses:
+            date, amount = max(self.daily_expenses.items(), key=lambda x: x[1])
+            statistics["Most Expensive Day"] = {"Date": date, "Amount": self._money(amount)}
+
+        # Item with the highest total spending
+        if self.item_totals:
+            description, amount = max(self.item_totals.items(), key=lambda x: x[1])
+            statistics["Item with Highest Total Spending"] = {"Description": description, "Total Amount": self._money(amount)}
+
+        return statistics
+
+def compute_statistics(df):
+    """
+    Compute the "Statistics" block of the categorized data from columnar arrays.
+
+    Args:
+        df (pd.DataFrame): Universal transactions with Date, Description, Expense, Income and Balance columns.
+
+    Returns:
+        dict: The statistics, keyed exactly like categorized_data.json.
+    """
+    accumulator = StatisticsAccumulator()
+    accumulator.update(df)
+    return accumulator.result()
+
+def new_categorized_data(filters, statistics=None):
+    # Initialize data structure for categorized data
+    categorized_data = {
+        "Statistics": statistics,
         "Income": {},
         "Expenses": {},
         "Transfers": {},
         "Withdrawals": {},
         "Uncategorized": []  # Add this line for uncategorized transactions
     }
-    
-    # Dictionary to track daily expenses
-    daily_expenses = {}
-    
-    # Dictionary to track total spending on each item
-    item_totals = defaultdict(float)
 
     # Process each category in the JSON file
     for main_category, subcategories in filters.items():
+        if main_category == RULES_KEY:
+            continue
         if main_category not in categorized_data:
             categorized_data[main_category] = {}
         for subcategory, keywords in subcategories.items():
             categorized_data[main_category][subcategory] = []
 
-    # Read the CSV file and categorize transactions
-    transactions = []
-    unique_dates = set()
-    with open(csv_file, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            date = row["Date"]
-            description = row["Description"]
-            expense = float(row["Expense"])
-            income = float(row["Income"])
-            balance = float(row["Balance"])
-            amount = income if income > 0 else -expense
-
-            # Track transactions and dates for balance and spending calculation
-            transactions.append(balance)
-            unique_dates.add(date)
-
-            # Track daily expenses
-            if expense > 0:
-                if date not in daily_expenses:
-                    daily_expenses[date] = 0.0
-                daily_expenses[date] += expense
-                
-                # Track total spending for each item
-                item_totals[description] += expense
-
-            # Update statistics
-            if income > 0:
-                categorized_data["Statistics"]["Total Income"] += income
-            if expense > 0:
-                categorized_data["Statistics"]["Total Expenses"] += expense
-
-            # Increment total transactions count
-            categorized_data["Statistics"]["Total Transactions"] += 1
-
-            matched = False  # Track if the transaction was categorized
-
-            # Check each category for matching keywords
-            for main_category, subcategories in filters.items():
-                for subcategory, keywords in subcategories.items():
-                    if isinstance(keywords, list):
-                        if any(keyword.upper() in description.upper() for keyword in keywords):
-                            categorized_data[main_category][subcategory].append({
-                                "Date": date,
-                                "Description": description,
-                                "Amount": amount
-                            })
-                            matched = True
-                    elif isinstance(keywords, str):
-                        if keywords.upper() in description.upper():
-                            categorized_data[main_category][subcategory].append({
-                                "Date": date,
-                                "Description": description,
-                                "Amount": amount
-                            })
-                            matched = True
-
-            # Add to uncategorized if not matched
-            if not matched:
-                categorized_data["Uncategorized"].append({
-                    "Date": date,
-                    "Description": description,
-                    "Amount": amount
-                })
-
-    # Calculate starting and ending balances
-    if transactions:
-        categorized_data["Statistics"]["Starting Balance"] = round(transactions[0], 2)
-        categorized_data["Statistics"]["Ending Balance"] = round(transactions[-1], 2)
-
-    # Calculate average daily spending and income
-    if unique_dates:
-        num_days = len(unique_dates)
-        categorized_data["Statistics"]["Average Daily Spending"] = round(
-            categorized_data["Statistics"]["Total Expenses"] / num_days, 2
-        )
-        categorized_data["Statistics"]["Average Daily Income"] = round(
-            categorized_data["Statistics"]["Total Income"] / num_days, 2
-        )
-
-    # Find the most expensive day
-    if daily_expenses:
-        most_expensive_day = max(daily_expenses.items(), key=lambda x: x[1])
-        categorized_data["Statistics"]["Most Expensive Day"] = {
-            "Date": most_expensive_day[0],
-            "Amount": round(most_expensive_day[1], 2)
-        }
+    # Rules may target subcategories that have no keywords
+    for rule in filters.get(RULES_KEY, []):
+        categorized_data.setdefault(rule["Category"], {}).setdefault(rule["Subcategory"], [])
+    return categorized_data
 
-    # Find the item with the highest total spending
-    if item_totals:
-        highest_spending_item = max(item_totals.items(), key=lambda x: x[1])
-        categorized_data["Statistics"]["Item with Highest Total Spending"] = {
-            "Description": highest_spending_item[0],
-            "Total Amount": round(highest_spending_item[1], 2)
-        }
+def categorize_rows(categorized_data, matcher, transactions):
+    # Signed amount per row: income if any, otherwise the expense as a negative
+    expense = transactions["Expense"].to_numpy()
+    income = transactions["Income"].to_numpy()
+    amounts = np.where(income > 0, income, -expense)
+    amounts = (from_cents(amounts) if is_cents(amounts) else amounts.astype(float)).tolist()
+    dates = date_strings(transactions["Date"]).tolist()
+    descriptions = description_strings(transactions["Description"]).tolist()
 
+    # The first matching rule of each row, evaluated on whole columns; -1 falls back to the keywords
+    rules = matcher.rules.evaluate(transactions).tolist()
+
+    # Categorize transactions
+    for date, description, amount, rule in zip(dates, descriptions, amounts, rules):
+        # A rule puts the row in exactly one subcategory, otherwise every subcategory whose keywords match
+        matched = False  # Track if the transaction was categorized
+        targets = [matcher.rules.targets[rule]] if rule >= 0 else matcher.categorize(description)
+        for main_category, subcategory in targets:
+            categorized_data[main_category][subcategory].append({
+                "Date": date,
+                "Description": description,
+                "Amount": amount
+            })
+            matched = True
+
+        # Add to uncategorized if not matched
+        if not matched:
+            categorized_data["Uncategorized"].append({
+                "Date": date,
+                "Description": description,
+                "Amount": amount
+            })
+
+def extract_data(transactions, json_file, cache_file=None, matcher=None, aggregates=None):
+    # Load filter.json
+    with open(json_file, 'r') as f:
+        filters = json.load(f)
+
+    # Accept the converter's DataFrame directly, or read the universal CSV
+    if not isinstance(transactions, pd.DataFrame):
+        transactions = load_transactions(transactions)
+
+    categorized_data = new_categorized_data(filters, compute_statistics(transactions))
+
+    # Compile every keyword into a single matcher, once; repeated descriptions hit its cache
+    matcher = matcher or KeywordMatcher(filters, cache_file)
+    categorize_rows(categorized_data, matcher, transactions)
+    if aggregates is not None:
+        # Monthly partitions for period reports, built in the same pass (see processor/periods.py)
+        aggregates.update(transactions)
+    matcher.save_cache()
     return categorized_data
 
-# Example usage
-if __name__ == "__main__":
-    csv_file = "universal_transactions.csv"
-    json_file = "filter.json"
-    data = extract_data(csv_file, json_file)
-    
-    # Save categorized data as JSON in the script's directory
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_file = os.path.join(script_dir, "categorized_data.json")
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=4)
-    
-    # Print the location of the saved file
-    print(f"Categorized data saved to: {output_file}")
+def extract_period(categorized_data, aggregates, start, end):
+    """
+    Narrow the categorized data down to a range of months.
+
+    The statistics are combined from the monthly partitions instead of rescanning the
+    transactions; the breakdown keeps the rows dated inside the range. A breakdown trimmed
+    by the streaming mode gets the period's own "Omitted" counts: the transactions the
+    partitions hold for each subcategory, minus the rows that were kept.
+
+    Args:
+        categorized_data (dict): The categorized data of the full history.
+        aggregates (MonthlyAggregates): The monthly partitions of the same transactions.
+        start (pd.Period): First month.
+        end (pd.Period): Last month, inclusive.
+
+    Returns:
+        dict: The categorized data of the period, keyed like categorized_data.json.
+    """
+    first, last = f"{start}-01", f"{end}-31"  # ISO dates compare as strings
+    def in_range(rows):
+        return [row for row in rows if first <= row["Date"] <= last]
+
+    data = {}
+    for main_category, subcategories in categorized_data.items():
+        if main_category == "Statistics":
+            data[main_category] = aggregates.statistics(start, end)
+        elif isinstance(subcategories, list):
+            data[main_category] = in_range(subcategories)
+        elif main_category != "Omitted":
+            data[main_category] = {subcategory: in_range(rows) for subcategory, rows in subcategories.items()}
+
+    if "Omitted" in categorized_data:
+        omitted = {}
+        for (main_category, subcategory), count in aggregates.category_totals(start, end)["Transactions"].items():
+            if main_category == "Uncategorized":
+                dropped = count - len(data.get(main_category, []))
+                if dropped > 0:
+                    omitted[main_category] = int(dropped)
+            else:
+                dropped = count - len(data.get(main_category, {}).get(subcategory, []))
+                if dropped > 0:
+                    omitted.setdefault(main_category, {})[subcategory] = int(dropped)
+        if omitted:
+            data["Omitted"] = omitted
+    return data
+
+def _trim(rows, limit):
+    # Keep the newest `limit` rows of a breakdown list; return how many were dropped
+    extra = len(rows) - limit
+    if extra <= 0:
+        return 0
+    del rows[:extra]
+    return extra
+
+def extract_stream(batches, json_file, breakdown_limit=0, cache_file=None, matcher=None, aggregates=None):
+    """
+    Categorize and compute statistics over chunks of transactions with bounded memory.
+
+    Args:
+        batches (iterable of pd.DataFrame): Universal transactions in date order, chunk by chunk.
+        json_file (str): The filter.json with the categories.
+        breakdown_limit (int): Newest rows kept per subcategory for the breakdown pages; 0 keeps all.
+        cache_file (str, optional): Persistent description -> category cache (see KeywordMatcher).
+        matcher (KeywordMatcher, optional): An already compiled matcher to share, instead of building one.
+        aggregates (MonthlyAggregates, optional): Monthly partitions to fill in the same pass.
+
+    Returns:
+        dict: The categorized data. When rows were dropped, an "Omitted" entry counts them
+        per subcategory (and for "Uncategorized").
+    """
+    # Load filter.json
+    with open(json_file, 'r') as f:
+        filters = json.load(f)
+
+    categorized_data = new_categorized_data(filters)
+    matcher = matcher or KeywordMatcher(filters, cache_file)
+    statistics = StatisticsAccumulator()
+    omitted = {}
+
+    for batch in batches:
+        statistics.update(batch)
+        categorize_rows(categorized_data, matcher, batch)
+        if aggregates is not None:
+            aggregates.update(batch)
+        if breakdown_limit > 0:
+            # Drop the oldest rows now, so the lists never grow past limit + one batch
+            for main_category, subcategories in categorized_data.items():
+                if main_category == "Statistics":
+                    continue
+                if main_category == "Uncategorized":
+                    dropped = _trim(subcategories, breakdown_limit)
+                    if dropped:
+                        omitted["Uncategorized"] = omitted.get("Uncategorized", 0) + dropped
+                    continue
+                for subcategory, rows in subcategories.items():
+                    dropped = _trim(rows, breakdown_limit)
+                    if dropped:
+                        counts = omitted.setdefault(main_category, {})
+                        counts[subcategory] = counts.get(subcategory, 0) + dropped
+
+    matcher.save_cache()
+    categorized_data["Statistics"] = statistics.result()
+    if omitted:
+        categorized_data["Omitted"] = omitted
+    return categorized_data
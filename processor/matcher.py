@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+from processor.rules import RULES_KEY, RuleSet
+
+class KeywordMatcher:
+    def __init__(self, filters, cache_file=None):
+        """
+        Compile the keywords of filter.json into a single multi-pattern matcher.
+
+        Every keyword is upper-cased once and folded into a trie that is emitted
+        as one regular expression, so a description is scanned a single time no
+        matter how many keywords the filter holds. The result for a description
+        is the same as testing ``keyword.upper() in description.upper()`` for
+        every keyword of every subcategory.
+
+        Results are memoized per description, since statements repeat the same
+        merchants over and over. The memo is tied to a hash of the filter content
+        and can be kept on disk between runs.
+
+        The "Rules" of filter.json are compiled alongside into ``self.rules`` (see
+        processor/rules.py); they are evaluated per chunk and take precedence over
+        the keywords.
+
+        Args:
+            filters (dict): The parsed filter.json, {category: {subcategory: keywords}}.
+            cache_file (str, optional): JSON file to load the memo from and save it to.
+        """
+        # Content hash of the filters; a cache built from other filters is ignored
+        self.filter_hash = hashlib.sha256(json.dumps(filters).encode("utf-8")).hexdigest()
+        self.cache_file = cache_file
+        self.cache = {}  # description -> matching (category, subcategory) pairs
+        self.cache_misses = 0
+
+        # Ordered list of (category, subcategory) targets, in filter.json order
+        self.targets = []
+        keyword_targets = {}
+        for main_category, subcategories in filters.items():
+            if main_category == RULES_KEY:
+                continue
+            for subcategory, keywords in subcategories.items():
+                if isinstance(keywords, str):
+                    keywords = [keywords]
+                elif not isinstance(keywords, list):
+                    continue
+                index = len(self.targets)
+                self.targets.append((main_category, subcategory))
+                for keyword in keywords:
+                    keyword_targets.setdefault(keyword.upper(), set()).add(index)
+
+        # An empty keyword is contained in every description
+        self.always = frozenset(keyword_targets.pop("", ()))
+
+        # A keyword also implies every keyword that is a substring of it, so the
+        # scan only has to report the longest keyword starting at each position
+        trie = self._build_trie(keyword_targets)
+        self.implied = {}
+        for keyword in keyword_targets:
+            hits = set()
+            for start in range(len(keyword)):
+                node = trie
+                for char in keyword[start:]:
+                    node = node.get(char)
+                    if node is None:
+                        break
+                    hits.update(node.get("", ()))
+            self.implied[keyword] = frozenset(hits)
+
+        self.rules = RuleSet(filters.get(RULES_KEY, []))
+
+        self.pattern = None
+        if keyword_targets:
+            self.pattern = re.compile("(?=(" + self._trie_pattern(trie) + "))")
+
+        if cache_file:
+            self.load_cache()
+
+    @staticmethod
+    def _build_trie(keyword_targets):
+        """
+        Build a character trie of the keywords.
+
+        Args:
+            keyword_targets (dict): Upper-cased keyword -> set of target indexes.
+
+        Returns:
+            dict: Nested {char: node} dicts; the "" key of a node holds the targets
+            of the keyword ending there.
+        """
+        trie = {}
+        for keyword, indexes in keyword_targets.items():
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = indexes
+        return trie
+
+    @staticmethod
+    def _trie_pattern(trie):
+        """
+        Emit a prefix-factored regular expression from a keyword trie.
+
+        Args:
+            trie (dict): The trie built by ``_build_trie``.
+
+        Returns:
+            str: A pattern that matches the longest keyword at the current position.
+        """
+        def emit(node):
+            branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            if "" in node:
+                # Greedy optional group, so longer keywords win over their prefixes
+                return "(?:" + body + ")?"
+            return body
+
+        return emit(trie)
+
+    def match(self, description):
+        """
+        Find every (category, subcategory) whose keywords occur in a description.
+
+        Args:
+            description (str): The transaction description.
+
+        Returns:
+            frozenset of int: Indexes into ``self.targets`` that matched.
+        """
+        if self.pattern is None:
+            return self.always
+        hits = set(self.always)
+        for found in self.pattern.finditer(description.upper()):
+            hits.update(self.implied[found.group(1)])
+        return frozenset(hits)
+
+    def categorize(self, description):
+        """
+        Find the matching (category, subcategory) pairs in filter.json order.
+
+        Args:
+            description (str): The transaction description.
+
+        Returns:
+            list of tuple: The matching (category, subcategory) pairs.
+        """
+        pairs = self.cache.get(description)
+        if pairs is None:
+            pairs = tuple(self.targets[index] for index in sorted(self.match(description)))
+            self.cache[description] = pairs
+            self.cache_misses += 1
+        return list(pairs)
+
+    def load_cache(self):
+        """
+        Load the memo from ``cache_file`` if it was built from the same filters.
+
+        Returns:
+            bool: True if the cache was loaded.
+        """
+        if not os.path.exists(self.cache_file):
+            return False
+        try:
+            with open(self.cache_file, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False  # A broken cache is just rebuilt
+        if cached.get("Filter Hash") != self.filter_hash:
+            return False
+        self.cache = {description: tuple(tuple(pair) for pair in pairs)
+                      for description, pairs in cached.get("Matches", {}).items()}
+        return True
+
+    def save_cache(self):
+        """
+        Save the memo to ``cache_file``, when one is set and something new was matched.
+        """
+        if not self.cache_file or not self.cache_misses:
+            return
+        with open(self.cache_file, 'w') as f:
+            json.dump({"Filter Hash": self.filter_hash, "Matches": self.cache}, f)
+        self.cache_misses = 0
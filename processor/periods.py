@@ -0,0 +1,263 @@
+import numpy as np
+import pandas as pd
+from converter.money import from_cents, is_cents
+
+# Per-chunk aggregates kept before they are folded together
+MAX_PARTS = 32
+
+# Category of the transactions no rule or keyword matched
+UNCATEGORIZED = ("Uncategorized", "")
+
+def parse_period(text, last_month):
+    """
+    Turn a period name into an inclusive range of months.
+
+    Args:
+        text (str): "2024-10" (a month), "2024-Q4" (a quarter), "2024" (a year), "YTD" (January
+            up to the last month with transactions) or "2024-01:2024-06" (a custom range).
+        last_month (pd.Period): The last month with transactions, for "YTD".
+
+    Returns:
+        tuple: (first month, last month) as monthly pd.Period.
+
+    Raises:
+        ValueError: If the period can't be read or ends before it starts.
+    """
+    name = text.strip().upper()
+    try:
+        if name == "YTD":
+            start, end = pd.Period(year=last_month.year, month=1, freq="M"), last_month
+        elif ":" in name:
+            start, end = (pd.Period(part, freq="M") for part in name.split(":", 1))
+        elif "Q" in name:
+            quarter = pd.Period(name, freq="Q")
+            start, end = quarter.asfreq("M", "start"), quarter.asfreq("M", "end")
+        elif name.isdigit():
+            start, end = pd.Period(f"{name}-01", freq="M"), pd.Period(f"{name}-12", freq="M")
+        else:
+            start = end = pd.Period(name, freq="M")
+    except ValueError:
+        raise ValueError(f"Unknown period '{text}', use e.g. 2024-10, 2024-Q4, 2024, YTD or 2024-01:2024-06.")
+    if start > end:
+        raise ValueError(f"Period '{text}' ends before it starts.")
+    return start, end
+
+def _months(start, end):
+    # A month range as datetime64[M] bounds, like the Month level of the tables
+    return np.datetime64(str(start), 'M'), np.datetime64(str(end), 'M')
+
+class MonthlyAggregates:
+    def __init__(self, matcher=None):
+        """
+        Partition the transactions into (account, month) aggregates, built once.
+
+        Every chunk is reduced to per-day totals and per-month item and category totals, so
+        a report for any range of months combines a few partitions instead of rescanning
+        rows. The tables are:
+
+        - months, by (Account, Month): Income, Expenses, Transactions, Opening Balance and
+          Closing Balance (the balance after the month's first and last transaction)
+        - days, by (Account, Date): Expense, Income and Transactions of every active day
+        - items, by (Account, Month, Description): Expense
+        - categories, by (Account, Month, Category, Subcategory): Amount and Transactions,
+          counting a transaction in every subcategory it is listed under, like the breakdown
+
+        Args:
+            matcher (KeywordMatcher, optional): The compiled filter.json for the category
+                totals; without it the categories table stays empty.
+        """
+        self.matcher = matcher
+        self.cents = None  # Decided by the first chunk
+        self.parts = {"days": [], "items": [], "categories": []}
+        self.folded = {}
+
+    def update(self, df):
+        """
+        Add a chunk of transactions, in date order.
+
+        Args:
+            df (pd.DataFrame): Universal transactions.
+        """
+        df = df.dropna(subset=['Date'])
+        if df.empty:
+            return
+        if self.cents is None:
+            self.cents = is_cents(df["Expense"])
+        expense, income = df["Expense"].to_numpy(), df["Income"].to_numpy()
+        dates = df["Date"].to_numpy().astype('datetime64[D]')
+        frame = pd.DataFrame({
+            "Account": df["Account"].astype(str).to_numpy() if "Account" in df.columns else "",
+            "Month": dates.astype('datetime64[M]'),
+            "Date": dates,
+            "Description": df["Description"].astype(object).fillna("").astype(str).to_numpy(),
+            "Expense": np.where(expense > 0, expense, 0),
+            "Income": np.where(income > 0, income, 0),
+            "Balance": df["Balance"].to_numpy(),
+        })
+        self.parts["days"].append(frame.groupby(["Account", "Date"], sort=False).agg(
+            Month=("Month", "first"), Expense=("Expense", "sum"), Income=("Income", "sum"),
+            Transactions=("Balance", "size"), Opening=("Balance", "first"), Closing=("Balance", "last")))
+        spent = frame[frame["Expense"] > 0]
+        self.parts["items"].append(spent.groupby(["Account", "Month", "Description"], sort=False)[["Expense"]].sum())
+        if self.matcher is not None:
+            self.parts["categories"].append(self._category_totals(df, frame, income, expense))
+        self.folded = {}
+        if len(self.parts["days"]) > MAX_PARTS:
+            for name in self.parts:
+                self.parts[name] = [self.table(name)]
+
+    def __getstate__(self):
+        # Pickled with the folded tables only; the matcher belongs to the run that built them
+        parts = {name: [self.table(name)] if chunks else [] for name, chunks in self.parts.items()}
+        return {"matcher": None, "cents": self.cents, "parts": parts, "folded": {}}
+
+    def _category_totals(self, df, frame, income, expense):
+        # One row per (transaction, subcategory it is listed under), summed per partition
+        rules = self.matcher.rules.evaluate(df)
+        codes, uniques = pd.factorize(frame["Description"])
+        matches = [self.matcher.categorize(description) or [UNCATEGORIZED] for description in uniques.tolist()]
+        counts = np.array([len(pairs) for pairs in matches])[codes]
+        counts[rules >= 0] = 1  # A rule lists a transaction once
+        rows = np.repeat(np.arange(len(frame)), counts)
+
+        # Position of each repeated row among its row's matches
+        position = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        flat = pd.Series([pair for pairs in matches for pair in pairs], dtype=object).to_numpy()
+        offsets = np.cumsum([0] + [len(pairs) for pairs in matches])[:-1]
+        labels = np.empty(len(rows), dtype=object)
+        keyword = rules[rows] < 0
+        labels[keyword] = flat[offsets[codes[rows[keyword]]] + position[keyword]]
+        if not keyword.all():
+            rule_targets = pd.Series(self.matcher.rules.targets, dtype=object).to_numpy()
+            labels[~keyword] = rule_targets[rules[rows[~keyword]]]
+
+        amount = np.where(income > 0, income, -expense)
+        targets = pd.DataFrame(labels.tolist(), columns=["Category", "Subcategory"])
+        totals = pd.DataFrame({
+            "Account": frame["Account"].to_numpy()[rows],
+            "Month": frame["Month"].to_numpy()[rows],
+            "Category": targets["Category"].to_numpy(),
+            "Subcategory": targets["Subcategory"].to_numpy(),
+            "Amount": amount[rows],
+        })
+        return totals.groupby(["Account", "Month", "Category", "Subcategory"], sort=False).agg(
+            Amount=("Amount", "sum"), Transactions=("Amount", "size"))
+
+    def table(self, name):
+        """
+        Fold the chunks of one table together.
+
+        Args:
+            name (str): "months", "days", "items" or "categories".
+
+        Returns:
+            pd.DataFrame: The table, in first-seen order.
+        """
+        if name in self.folded:
+            return self.folded[name]
+        if name == "months":
+            table = self._month_table(self.table("days"))
+        elif not self.parts[name]:
+            table = pd.DataFrame()
+        elif name == "days":
+            table = pd.concat(self.parts[name]).groupby(level=[0, 1], sort=False).agg(
+                {"Month": "first", "Expense": "sum", "Income": "sum", "Transactions": "sum",
+                 "Opening": "first", "Closing": "last"})
+        else:
+            table = pd.concat(self.parts[name]).groupby(level=list(range(self.parts[name][0].index.nlevels)), sort=False).sum()
+        self.folded[name] = table
+        return table
+
+    @staticmethod
+    def _month_table(days):
+        # The monthly partitions, from the day totals
+        if days.empty:
+            return pd.DataFrame()
+        return days.reset_index().groupby(["Account", "Month"], sort=False).agg(**{
+            "Income": ("Income", "sum"), "Expenses": ("Expense", "sum"), "Transactions": ("Transactions", "sum"),
+            "Opening Balance": ("Opening", "first"), "Closing Balance": ("Closing", "last")})
+
+    def _select(self, name, start, end):
+        # Rows of a table whose Month lies in [start, end]
+        table = self.table(name)
+        if table.empty:
+            return table
+        first, last = _months(start, end)
+        month = table["Month"] if name == "days" else table.index.get_level_values("Month")
+        month = np.asarray(month, dtype='datetime64[M]')
+        return table[(month >= first) & (month <= last)]
+
+    def last_month(self):
+        # The latest month with transactions, as a pd.Period
+        days = self.table("days")
+        if days.empty:
+            return pd.Timestamp.now().to_period("M")
+        return pd.Period(str(np.asarray(days["Month"], dtype='datetime64[M]').max()), freq="M")
+
+    def date_range(self, start, end):
+        """
+        First and last day with transactions in a range of months.
+
+        Returns:
+            tuple: (first, last) pd.Timestamp, or (None, None) when the range is empty.
+        """
+        days = self._select("days", start, end)
+        if days.empty:
+            return None, None
+        dates = days.index.get_level_values("Date")
+        return pd.Timestamp(dates.min()), pd.Timestamp(dates.max())
+
+    def statistics(self, start, end):
+        """
+        Compute the "Statistics" block for a range of months from the partitions.
+
+        Args:
+            start (pd.Period): First month.
+            end (pd.Period): Last month, inclusive.
+
+        Returns:
+            dict: The statistics, keyed exactly like categorized_data.json.
+        """
+        from processor.extractor import StatisticsAccumulator
+        statistics = StatisticsAccumulator()
+        statistics.cents = self.cents
+        months = self._select("months", start, end)
+        if months.empty:
+            return statistics.result()
+
+        statistics.total_income = months["Income"].sum().item()
+        statistics.total_expenses = months["Expenses"].sum().item()
+        statistics.total_transactions = int(months["Transactions"].sum())
+
+        # Balances at the period boundaries: each account's first and last month in the range
+        by_account = months.sort_index(level="Month", kind="stable").groupby(level="Account", sort=False)
+        statistics.starting_balances = by_account["Opening Balance"].first().to_dict()
+        statistics.ending_balances = by_account["Closing Balance"].last().to_dict()
+
+        # Days are shared between accounts, so the daily figures come from the day totals
+        days = self._select("days", start, end)
+        daily = days[days["Expense"] > 0].groupby(level="Date", sort=False)["Expense"].sum()
+        statistics.unique_dates = set(days.index.get_level_values("Date").unique().tolist())
+        statistics.daily_expenses = dict(zip(pd.DatetimeIndex(daily.index).strftime("%Y-%m-%d"), daily.tolist()))
+
+        items = self._select("items", start, end)
+        if not items.empty:
+            totals = items["Expense"].groupby(level="Description", sort=False).sum()
+            statistics.item_totals = dict(zip(totals.index.tolist(), totals.tolist()))
+        return statistics.result()
+
+    def category_totals(self, start, end):
+        """
+        Total amount per (category, subcategory) over a range of months.
+
+        Returns:
+            pd.DataFrame: Amount (in currency units) and Transactions, by (Category, Subcategory);
+            the uncategorized transactions are under ("Uncategorized", "").
+        """
+        categories = self._select("categories", start, end)
+        if categories.empty:
+            return pd.DataFrame(columns=["Amount", "Transactions"])
+        totals = categories.groupby(level=["Category", "Subcategory"], sort=False).sum()
+        if self.cents:
+            totals["Amount"] = from_cents(totals["Amount"].to_numpy())
+        return totals
@@ -0,0 +1,134 @@
+import re
+import numpy as np
+import pandas as pd
+from converter.money import is_cents, to_cents
+
+# Top-level filter.json key holding the rule list; every other key is a keyword category
+RULES_KEY = "Rules"
+
+# Keys a rule may have; the conditions it sets must all hold
+RULE_KEYS = {"Category", "Subcategory", "Priority", "Keywords", "Prefix", "Regex", "Type",
+             "Min Amount", "Max Amount", "From", "To"}
+
+# Values of "Type"
+TYPES = ("Expense", "Income")
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+class RuleSet:
+    def __init__(self, rules):
+        """
+        Compile the "Rules" of filter.json into an evaluation plan over whole columns.
+
+        A rule assigns a transaction to one (Category, Subcategory) when all of its
+        conditions hold: description keywords, prefixes or a regular expression (all
+        case-insensitive), the transaction Type, an amount range and a date range.
+        Rules are tried by descending Priority, then in file order, and the first
+        rule that matches wins, so a ruled transaction is counted exactly once.
+
+        Text conditions are evaluated once per distinct description and spread to
+        the rows by their codes; amount and date conditions are NumPy comparisons,
+        so no condition is checked row by row in Python.
+
+        Args:
+            rules (list of dict): The rule objects, e.g.
+                {"Category": "Expenses", "Subcategory": "Big Purchases", "Type": "Expense", "Min Amount": 500}
+
+        Raises:
+            ValueError: If a rule has an unknown key, lacks a target or has a bad condition.
+        """
+        self.targets = []  # (category, subcategory) per rule, in evaluation order
+        self.plan = []  # Conditions per rule, in evaluation order
+        order = sorted(range(len(rules)), key=lambda index: -float(rules[index].get("Priority", 0)))
+        for index in order:
+            rule = rules[index]
+            unknown = set(rule) - RULE_KEYS
+            if unknown:
+                raise ValueError(f"Rule {index + 1} has unknown key(s): {', '.join(sorted(unknown))}.")
+            if not rule.get("Category") or not rule.get("Subcategory"):
+                raise ValueError(f"Rule {index + 1} needs a Category and a Subcategory.")
+            self.targets.append((rule["Category"], rule["Subcategory"]))
+            self.plan.append(self._compile(index, rule))
+
+    @staticmethod
+    def _compile(index, rule):
+        """
+        Turn one rule into a list of (kind, value) conditions.
+
+        Args:
+            index (int): Position of the rule in filter.json, for error messages.
+            rule (dict): The rule object.
+
+        Returns:
+            list of tuple: Conditions of kind "text" (compiled pattern), "type", "min", "max", "from" or "to".
+        """
+        conditions = []
+        if "Keywords" in rule:
+            keywords = "|".join(re.escape(keyword) for keyword in _as_list(rule["Keywords"]))
+            conditions.append(("text", re.compile(keywords, re.IGNORECASE)))
+        if "Prefix" in rule:
+            prefixes = "|".join(re.escape(prefix) for prefix in _as_list(rule["Prefix"]))
+            conditions.append(("text", re.compile(f"^(?:{prefixes})", re.IGNORECASE)))
+        if "Regex" in rule:
+            try:
+                conditions.append(("text", re.compile(rule["Regex"], re.IGNORECASE)))
+            except re.error as error:
+                raise ValueError(f"Rule {index + 1} has a bad Regex: {error}.")
+        if "Type" in rule:
+            if rule["Type"] not in TYPES:
+                raise ValueError(f"Rule {index + 1} Type must be one of {', '.join(TYPES)}.")
+            conditions.append(("type", rule["Type"]))
+        for key, kind in (("Min Amount", "min"), ("Max Amount", "max")):
+            if key in rule:
+                conditions.append((kind, float(rule[key])))
+        for key, kind in (("From", "from"), ("To", "to")):
+            if key in rule:
+                conditions.append((kind, np.datetime64(pd.Timestamp(rule[key]).normalize(), 'ns')))
+        return conditions
+
+    def __bool__(self):
+        return bool(self.plan)
+
+    def evaluate(self, df):
+        """
+        Find the winning rule of every transaction.
+
+        Args:
+            df (pd.DataFrame): Universal transactions with Date, Description, Expense and Income columns.
+
+        Returns:
+            np.ndarray: Index into ``self.targets`` per row, or -1 where no rule matched.
+        """
+        winners = np.full(len(df), -1, dtype=np.int64)
+        if not self.plan or not len(df):
+            return winners
+
+        # Distinct descriptions, with missing ones as "" (code -1 picks the trailing entry)
+        codes, uniques = pd.factorize(df["Description"].astype(object))
+        descriptions = pd.Series(np.append(uniques.to_numpy(dtype=object).astype(str), ""), dtype=object)
+
+        expense, income = df["Expense"].to_numpy(), df["Income"].to_numpy()
+        cents = is_cents(expense)
+        is_income = income > 0
+        amounts = np.where(is_income, income, expense)
+        dates = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]")
+
+        for index, conditions in enumerate(self.plan):
+            mask = winners < 0
+            for kind, value in conditions:
+                if not mask.any():
+                    break
+                if kind == "text":
+                    mask &= descriptions.str.contains(value, regex=True).to_numpy(dtype=bool)[codes]
+                elif kind == "type":
+                    mask &= is_income if value == "Income" else ~is_income
+                elif kind in ("min", "max"):
+                    limit = to_cents(value) if cents else value
+                    mask &= amounts >= limit if kind == "min" else amounts <= limit
+                elif kind == "from":
+                    mask &= dates >= value  # NaT compares False
+                else:
+                    mask &= dates < value + np.timedelta64(1, 'D')  # "To" includes the whole day
+            winners[mask] = index
+        return winners
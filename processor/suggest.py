@@ -0,0 +1,211 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+
+# Payment-type prefixes the banks put before the merchant, e.g. "VDP-" for an online card payment
+PREFIXES = re.compile(r"^(?:VDP-|VDC-|VDA-|D/D\s*|\*MOBI\s*|POS\s+|CONTACTLESS\s+)+")
+
+# Trailing country and currency tags of card payments
+CARD_SUFFIXES = {"IE", "IRL", "GB", "UK", "EUR", "GBP", "USD"}
+
+# Characters per n-gram of the similarity index
+NGRAM = 3
+
+# Lowest cosine similarity that is still suggested
+MIN_SCORE = 0.35
+
+# Raw descriptions shown per suggestion
+EXAMPLES = 3
+
+def normalize(description):
+    """
+    Reduce a bank description to its merchant name.
+
+    Upper-cases, strips payment-type prefixes, drops every token with a digit in it
+    (card numbers, references, store numbers) and trailing country tags.
+
+    Args:
+        description (str): The raw description, e.g. "VDP-AMAZON* 2X4 IE".
+
+    Returns:
+        str: e.g. "AMAZON"; "" when nothing is left.
+    """
+    text = PREFIXES.sub("", description.upper().strip())
+    tokens = [token for token in re.split(r"[^A-Z0-9&]+", text) if token and not any(char.isdigit() for char in token)]
+    while tokens and tokens[-1] in CARD_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+def keyword_for(name, descriptions):
+    """
+    Pick a filter.json keyword for a cluster: the longest leading run of its merchant name's
+    words that every raw description contains, so the keyword matches like the cluster does.
+
+    Args:
+        name (str): The normalized merchant name.
+        descriptions (list of str): The raw descriptions of the cluster.
+
+    Returns:
+        str: The keyword, or "" when no word is shared.
+    """
+    upper = [description.upper() for description in descriptions]
+    tokens = name.split()
+    for length in range(len(tokens), 0, -1):
+        keyword = " ".join(tokens[:length])
+        if all(keyword in description for description in upper):
+            return keyword
+    shared = [token for token in tokens if all(token in description for description in upper)]
+    return max(shared, key=len, default="")
+
+def _ngram_entries(names):
+    # (document, n-gram) pairs of the padded names, with term counts
+    documents, grams = [], []
+    for index, name in enumerate(names):
+        padded = f" {name} "
+        for start in range(max(1, len(padded) - NGRAM + 1)):
+            documents.append(index)
+            grams.append(padded[start:start + NGRAM])
+    entries = pd.DataFrame({"Document": documents, "Gram": grams})
+    return entries.groupby(["Document", "Gram"], sort=False).size().rename("Count").reset_index()
+
+def _tfidf(entries, documents):
+    # L2-normalized TF-IDF weight of every (document, n-gram) entry
+    frequency = entries.groupby("Gram")["Document"].transform("size").to_numpy()
+    weight = entries["Count"].to_numpy() * (np.log((1 + documents) / (1 + frequency)) + 1)
+    norms = np.sqrt(pd.Series(weight ** 2).groupby(entries["Document"].to_numpy()).transform("sum").to_numpy())
+    return weight / norms
+
+def similarities(queries, labelled):
+    """
+    Cosine similarity of every query name to the labelled names that share an n-gram.
+
+    Both sides are TF-IDF vectors of character n-grams. The labelled entries are sorted by
+    n-gram into an inverted index, so only pairs that share an n-gram are ever multiplied.
+
+    Args:
+        queries (list of str): Normalized names to find matches for.
+        labelled (list of str): Normalized names of categorized transactions.
+
+    Returns:
+        pd.DataFrame: Query, Labelled (indexes into the lists) and Score.
+    """
+    entries = _ngram_entries(list(queries) + list(labelled))
+    entries["Weight"] = _tfidf(entries, len(queries) + len(labelled))
+    entries["Gram"] = pd.factorize(entries["Gram"])[0]
+    is_query = entries["Document"].to_numpy() < len(queries)
+    query, index = entries[is_query], entries[~is_query].sort_values("Gram", kind="stable")
+
+    # Posting range of every query n-gram in the index
+    index_grams = index["Gram"].to_numpy()
+    starts = np.searchsorted(index_grams, query["Gram"].to_numpy(), "left")
+    lengths = np.searchsorted(index_grams, query["Gram"].to_numpy(), "right") - starts
+    pairs = np.repeat(np.arange(len(query)), lengths)
+    postings = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+
+    scores = pd.DataFrame({
+        "Query": query["Document"].to_numpy()[pairs],
+        "Labelled": index["Document"].to_numpy()[postings] - len(queries),
+        "Score": query["Weight"].to_numpy()[pairs] * index["Weight"].to_numpy()[postings],
+    })
+    return scores.groupby(["Query", "Labelled"], sort=False)["Score"].sum().reset_index()
+
+def _rows(data):
+    # (category, subcategory, row) of every categorized transaction
+    for main_category, subcategories in data.items():
+        if main_category in ("Statistics", "Uncategorized", "Omitted") or not isinstance(subcategories, dict):
+            continue
+        for subcategory, rows in subcategories.items():
+            for row in rows:
+                yield main_category, subcategory, row
+
+def suggest(data, min_score=MIN_SCORE):
+    """
+    Propose filter.json keywords for the uncategorized transactions.
+
+    Uncategorized descriptions are clustered by their normalized merchant name. Every cluster
+    gets the (category, subcategory) of the most similar categorized merchant name.
+
+    Args:
+        data (dict): The categorized data.
+        min_score (float): Lowest similarity to suggest a category for.
+
+    Returns:
+        dict: "Patch" ({category: {subcategory: [keywords]}} to merge into filter.json),
+        "Suggestions" (ranked by score, then transactions) and "Unmatched" (clusters
+        without a similar categorized merchant, most transactions first).
+    """
+    # Clusters of the uncategorized rows
+    clusters = {}
+    for row in data.get("Uncategorized", []):
+        name = normalize(row["Description"])
+        if not name:
+            continue
+        cluster = clusters.setdefault(name, {"Descriptions": {}, "Transactions": 0, "Amount": 0})
+        cluster["Descriptions"][row["Description"]] = None
+        cluster["Transactions"] += 1
+        cluster["Amount"] += round(row["Amount"] * 100)
+
+    # Categorized merchant names and how often each went to which subcategory
+    votes = {}
+    for main_category, subcategory, row in _rows(data):
+        name = normalize(row["Description"])
+        if name:
+            targets = votes.setdefault(name, {})
+            targets[(main_category, subcategory)] = targets.get((main_category, subcategory), 0) + 1
+    labelled = list(votes)
+    labels = [max(targets.items(), key=lambda item: item[1])[0] for targets in votes.values()]
+
+    names = list(clusters)
+    best = pd.DataFrame(columns=["Query", "Labelled", "Score"])
+    if names and labelled:
+        scores = similarities(names, labelled)
+        best = scores.loc[scores.groupby("Query", sort=False)["Score"].idxmax()]
+    best = {query: (labelled_index, score) for query, labelled_index, score
+            in zip(best["Query"].tolist(), best["Labelled"].tolist(), best["Score"].tolist())}
+
+    suggestions, unmatched = [], []
+    for query, name in enumerate(names):
+        cluster = clusters[name]
+        descriptions = list(cluster["Descriptions"])
+        entry = {
+            "Keyword": keyword_for(name, descriptions),
+            "Transactions": cluster["Transactions"],
+            "Amount": cluster["Amount"] / 100,
+            "Examples": descriptions[:EXAMPLES],
+        }
+        if not entry["Keyword"]:
+            continue
+        labelled_index, score = best.get(query, (None, 0.0))
+        if score >= min_score:
+            main_category, subcategory = labels[labelled_index]
+            suggestions.append({"Category": main_category, "Subcategory": subcategory, "Score": round(score, 3),
+                                "Similar To": labelled[labelled_index], **entry})
+        else:
+            unmatched.append(entry)
+
+    suggestions.sort(key=lambda entry: (-entry["Score"], -entry["Transactions"]))
+    unmatched.sort(key=lambda entry: -entry["Transactions"])
+    patch = {}
+    for entry in suggestions:
+        keywords = patch.setdefault(entry["Category"], {}).setdefault(entry["Subcategory"], [])
+        if entry["Keyword"] not in keywords:
+            keywords.append(entry["Keyword"])
+    return {"Patch": patch, "Suggestions": suggestions, "Unmatched": unmatched}
+
+def write_suggestions(output_file, data, min_score=MIN_SCORE):
+    """
+    Write the suggestions for the uncategorized transactions as JSON.
+
+    Args:
+        output_file (str): Path of the JSON file.
+        data (dict): The categorized data.
+        min_score (float): Lowest similarity to suggest a category for.
+
+    Returns:
+        dict: The suggestions (see suggest).
+    """
+    suggestions = suggest(data, min_score)
+    with open(output_file, 'w') as f:
+        json.dump(suggestions, f, indent=4)
+    return suggestions
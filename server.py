@@ -0,0 +1,286 @@
+# Local HTTP service keeping the transactions, the compiled filter.json and the aggregates warm
+# Run from the repository root: python server.py --port 8765
+import argparse
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from pipeline import Pipeline, load_settings
+from stage_cache import cache_key, file_digest
+
+# Largest statement upload accepted, in bytes
+MAX_UPLOAD = 50 * 2**20
+
+# Columns the graph and the PDF read from the transactions; only these are sent to a render worker
+RENDER_COLUMNS = ["Date", "Balance", "Account", "Bank"]
+
+def render_report(settings, transactions, data, chart_data, date_range=None):
+    """
+    Render a PDF report in a worker process.
+
+    Args:
+        settings (dict): The parsed settings.json.
+        transactions (pd.DataFrame): The transactions of the report (RENDER_COLUMNS).
+        data (dict): The categorized data of the report.
+        chart_data (dict): The chart tables (see charts.chart_tables).
+        date_range (tuple, optional): First and last day shown on the overview page.
+
+    Returns:
+        bytes: The PDF.
+    """
+    from charts import create_charts
+    from crafter.pdfer import create_pdf
+    from grapher import create_graph
+    config = settings["Config"]
+    graph = create_graph(transactions, config["Currency"], int(config["Graph_Interval"]))
+    charts = create_charts(chart_data, config["Currency"])
+    with tempfile.TemporaryDirectory(prefix="miabudget-") as directory:
+        output_file = os.path.join(directory, "Budget.pdf")
+        create_pdf(output_file, transactions, data, settings, graph, charts, date_range)
+        with open(output_file, 'rb') as f:
+            return f.read()
+
+class ReportService:
+    def __init__(self, settings, input_folder="input", mapping_file="banks.json", filter_file="filter.json", workers=2):
+        """
+        Keep one pipeline's results in memory and answer report requests from them.
+
+        The transactions, categorized data, monthly aggregates and compiled matcher stay
+        loaded between requests; they are only rebuilt when an input file, filter.json or
+        banks.json changes. Rendering is CPU-bound and runs on a process pool, so one
+        slow PDF doesn't hold up the other requests.
+
+        Args:
+            settings (dict): The parsed settings.json.
+            input_folder (str): The folder containing the bank CSV files; uploads go here too.
+            mapping_file (str): The JSON file containing the header mappings.
+            filter_file (str): The filter.json with the categories.
+            workers (int): Processes rendering PDFs.
+        """
+        self.settings = settings
+        self.input_folder = input_folder
+        self.pipeline = Pipeline(settings, input_folder, mapping_file, filter_file)
+        self.lock = threading.Lock()
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.state = None  # Key of the inputs the loaded results were built from
+        self.reports = {}  # Period -> rendered PDF, for the current state
+
+    def inputs_key(self):
+        # Changes whenever an input file, filter.json or banks.json does
+        pipeline = self.pipeline
+        return cache_key(pipeline.input_files(), file_digest(pipeline.filter_file), file_digest(pipeline.mapping_file))
+
+    def refresh(self):
+        """
+        Reload the transactions and categories if the inputs changed since the last request.
+
+        Returns:
+            Pipeline: The pipeline holding the current results.
+        """
+        with self.lock:
+            key = self.inputs_key()
+            if key != self.state:
+                chunksize = int(self.pipeline.config.get("Stream_Chunksize", "0"))
+                if chunksize > 0:
+                    self.pipeline.stream(chunksize)
+                else:
+                    self.pipeline.ingest()
+                    self.pipeline.categorize()
+                self.state, self.reports = key, {}
+            return self.pipeline
+
+    def period(self, pipeline, name):
+        # (start, end) months of a period name, or None for the full history
+        if not name:
+            return None
+        from processor.periods import parse_period
+        return parse_period(name, pipeline.aggregates.last_month())
+
+    def statistics(self, name=None):
+        """
+        Args:
+            name (str, optional): A period (see processor/periods.py); the full history if None.
+
+        Returns:
+            dict: The "Statistics" block.
+        """
+        pipeline = self.refresh()
+        months = self.period(pipeline, name)
+        if months is None:
+            return pipeline.categorized_data["Statistics"]
+        return pipeline.aggregates.statistics(*months)
+
+    def categorized_data(self, name=None):
+        # The categorized data, narrowed to a period when one is given
+        pipeline = self.refresh()
+        months = self.period(pipeline, name)
+        if months is None:
+            return pipeline.categorized_data
+        from processor.extractor import extract_period
+        return extract_period(pipeline.categorized_data, pipeline.aggregates, *months)
+
+    def report(self, name=None):
+        """
+        Render (or reuse) the PDF report of a period.
+
+        Args:
+            name (str, optional): A period (see processor/periods.py); the full history if None.
+
+        Returns:
+            bytes: The PDF.
+
+        Raises:
+            ValueError: If the period is unknown or holds no transactions.
+        """
+        import numpy as np
+        from charts import chart_tables
+        from processor.extractor import extract_period
+        pipeline = self.refresh()
+        with self.lock:
+            state = self.state
+            if name in self.reports:
+                return self.reports[name]
+            transactions = pipeline.transactions[[column for column in RENDER_COLUMNS if column in pipeline.transactions.columns]]
+            top_merchants = int(pipeline.config.get("Top_Merchants", "10"))
+            months = self.period(pipeline, name)
+            if months is None:
+                data, chart_data, date_range = pipeline.categorized_data, pipeline.chart_data, None
+            else:
+                date_range = pipeline.aggregates.date_range(*months)
+                if date_range[0] is None:
+                    raise ValueError(f"No transactions in period {name}.")
+                dates = transactions['Date'].to_numpy()
+                first, after = np.datetime64(months[0].start_time), np.datetime64((months[1] + 1).start_time)
+                transactions = transactions.iloc[np.searchsorted(dates, first):np.searchsorted(dates, after)]
+                data = extract_period(pipeline.categorized_data, pipeline.aggregates, *months)
+                chart_data = chart_tables(pipeline.chart_totals, top_merchants, *months)
+
+        # Rendered outside the lock, so other requests go on meanwhile
+        pdf = self.executor.submit(render_report, self.settings, transactions, data, chart_data, date_range).result()
+        with self.lock:
+            if self.state == state:
+                self.reports[name] = pdf
+        return pdf
+
+    def upload(self, file_name, content):
+        """
+        Save an uploaded statement into the input folder; the next request picks it up.
+
+        Args:
+            file_name (str): Name of the CSV file, without folders.
+            content (bytes): The file content.
+
+        Returns:
+            str: The saved path.
+
+        Raises:
+            ValueError: If the name isn't a plain .csv file name or no bank matches the header row.
+        """
+        if not re.fullmatch(r"[\w\- .]+\.csv", file_name or "", re.IGNORECASE) or file_name.startswith("."):
+            raise ValueError("Upload a statement as ?name=<file>.csv (letters, digits, spaces, '.', '-' and '_').")
+        os.makedirs(self.input_folder, exist_ok=True)
+        path = os.path.join(self.input_folder, file_name)
+        # Written aside and renamed, so a request never reads half a file, nor a statement no bank can read
+        with open(path + ".part", 'wb') as f:
+            f.write(content)
+        try:
+            self.pipeline.processor().detect_bank(path + ".part")
+        except (ValueError, UnicodeDecodeError) as e:
+            os.remove(path + ".part")
+            raise ValueError(f"{file_name} is not a known bank statement: {e}")
+        os.replace(path + ".part", path)
+        return path
+
+    def close(self):
+        self.executor.shutdown()
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # GET /health, /statistics, /categorized, /report (each with an optional ?period=);
+    # POST /statements?name=<file>.csv with the CSV as the body
+    service = None  # Set by serve()
+
+    def send(self, status, body, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body, indent=4).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, method):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        period = query.get("period")
+        try:
+            if method == "GET" and url.path == "/health":
+                self.send(200, {"Status": "ok"})
+            elif method == "GET" and url.path == "/statistics":
+                self.send(200, self.service.statistics(period))
+            elif method == "GET" and url.path == "/categorized":
+                self.send(200, self.service.categorized_data(period))
+            elif method == "GET" and url.path == "/report":
+                self.send(200, self.service.report(period), "application/pdf")
+            elif method == "POST" and url.path == "/statements":
+                # Check the declared length before reading: a missing one can't be read to the end,
+                # and rfile.read(-1) would block until the client closes the connection
+                length = self.headers.get("Content-Length")
+                if length is None:
+                    self.send(411, {"Error": "Content-Length is required."})
+                    return
+                if not length.strip().isdigit():
+                    self.send(400, {"Error": f"Invalid Content-Length: {length}."})
+                    return
+                length = int(length)
+                if length > MAX_UPLOAD:
+                    self.send(413, {"Error": f"Statements are limited to {MAX_UPLOAD // 2**20} MB."})
+                    return
+                path = self.service.upload(query.get("name"), self.rfile.read(length))
+                self.send(201, {"Saved": path, "Statistics": self.service.statistics()})
+            else:
+                self.send(404, {"Error": f"No {method} {url.path}."})
+        except (ValueError, FileNotFoundError) as e:
+            self.send(400, {"Error": str(e)})
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+def serve(settings, host="127.0.0.1", port=8765, workers=2, input_folder="input"):
+    """
+    Serve reports over HTTP until interrupted.
+
+    Args:
+        settings (dict): The parsed settings.json.
+        host (str): Interface to listen on; the default only accepts local connections.
+        port (int): TCP port.
+        workers (int): Processes rendering PDFs.
+        input_folder (str): The folder containing the bank CSV files.
+    """
+    service = ReportService(settings, input_folder, workers=workers)
+    service.refresh()  # Load everything before the first request
+    handler = type("Handler", (RequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving MiaBudget on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve MiaBudget statistics and reports over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="Processes rendering PDFs")
+    parser.add_argument("--input", default="input", help="Folder of the statements; uploads are saved here")
+    args = parser.parse_args()
+    serve(load_settings("settings.json"), args.host, args.port, args.workers, args.input)
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import pickle
+
+# Bump when a stage's output changes shape or content, so older entries are never read back
+# (2: chart labels per (category, subcategory); 3: after the categorize/stream tuples grew;
+# 4: ingest and stream keep their rejected rows; 5: monthly aggregates without the daily peaks)
+CACHE_VERSION = 5
+
+# Entries kept per stage; the least recently used ones are removed when a new one is saved
+MAX_ENTRIES = 4
+
+def cache_key(*parts):
+    """
+    Hash the inputs and config of a stage into its cache key.
+
+    Args:
+        *parts: JSON-serializable values, e.g. file digests, config values and upstream keys.
+
+    Returns:
+        str: Hex sha256 of the parts.
+    """
+    payload = json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def file_digest(path):
+    # Hex sha256 of a small file's content, e.g. filter.json
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class StageCache:
+    def __init__(self, directory=None, read=True):
+        """
+        Content-addressed store of pipeline stage outputs.
+
+        Each output is pickled under ``<stage>-<key>.pkl``, where the key hashes everything
+        the stage depends on, so a changed input simply misses and the old entry ages out.
+
+        Args:
+            directory (str, optional): Folder of the cache; None disables it.
+            read (bool): Look entries up; False only saves, e.g. for a forced rebuild.
+        """
+        self.directory = directory
+        self.read = read
+        self.hits = set()  # Stages served from the cache in this run
+
+    def path(self, stage, key):
+        return os.path.join(self.directory, f"{stage}-{key}.pkl")
+
+    def load(self, stage, key, size=None):
+        """
+        Look a stage output up.
+
+        Args:
+            stage (str): The stage name.
+            key (str): The stage's cache key.
+            size (int, optional): Items of the tuple the stage stores; an entry of another
+                shape, e.g. from before CACHE_VERSION was bumped, counts as a miss.
+
+        Returns:
+            The cached output, or None on a miss.
+        """
+        if not self.directory or not self.read:
+            return None
+        path = self.path(stage, key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None  # Missing or unreadable entries are just rebuilt
+        if size is not None and not (isinstance(value, tuple) and len(value) == size):
+            return None
+        os.utime(path)  # Mark as recently used
+        self.hits.add(stage)
+        return value
+
+    def save(self, stage, key, value):
+        """
+        Store a stage output and drop the stage's least recently used entries.
+
+        Args:
+            stage (str): The stage name.
+            key (str): The stage's cache key.
+            value: The picklable output.
+        """
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(stage, key)
+        # Written aside and renamed, so an interrupted run never leaves half an entry
+        with open(path + ".tmp", 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                   if name.startswith(f"{stage}-") and name.endswith(".pkl")]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for old_entry in entries[MAX_ENTRIES:]:
+            os.remove(old_entry)